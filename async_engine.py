@@ -0,0 +1,246 @@
+import asyncio
+from datetime import datetime
+from urllib.parse import urljoin
+
+from playwright.async_api import async_playwright, TimeoutError, Error as PageError
+
+from crawl_config import CrawlConfig
+from dedup import minhash
+from extraction import extract_page_async
+from metrics import Metrics
+from url_utils import canonicalize_url
+
+
+class AsyncCrawler:
+    """
+    Asyncio crawl engine driving every page from a single event loop.
+
+    Instead of a thread per page, each seed gets an `asyncio.Semaphore` sized
+    by its Config `max_threads` column, which bounds how many of its pages are
+    open at once. Seeds are crawled concurrently on one browser per headless
+    mode, and `max_pages` optionally caps the number of open pages across all
+    seeds. Articles are stored through `Database.store_db`, or the article
+    pipeline when one is given, so the engine writes exactly the same rows as
+    the threaded engine.
+
+    Args:
+        log (logging.Logger): Logger used for crawl messages.
+        db (Database): Connected database used to read Config rows and store articles.
+        headless (bool): Headless mode for Config rows without a headless column.
+        max_pages (int, optional): Global cap on concurrently open pages.
+        seen_store (SeenStore, optional): Canonical URLs of stored articles;
+            these pages are still searched for links but not stored again.
+        metrics (Metrics, optional): Receives stage timings, page and error
+            counts; `active_pages` counts the pages open at the moment.
+        configs (ConfigStore, optional): Config rows to crawl from; looked up
+            again before every level, so Config edits apply to running seeds.
+            Without it each seed reads its row from `db` once.
+        sink (ArticlePipeline, optional): Pipeline receiving the stored
+            articles instead of `db`.
+        near_duplicates (MinHashIndex, optional): Signatures of stored
+            articles; near duplicates of them are not stored.
+    """
+
+    def __init__(self, log, db, headless=False, max_pages=None, seen_store=None, metrics=None, configs=None, sink=None,
+                 near_duplicates=None):
+        self.logger = log
+        self.near_duplicates = near_duplicates
+        self.sink = sink
+        self.configs = configs
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.active_pages = 0
+        self.db = db
+        self.headless = headless
+        self.max_pages = max_pages
+        self.seen_store = seen_store
+        self._db_lock = None
+        self._page_slots = None
+        self._browsers = {}
+
+    async def crawl(self, url_ids):
+        """
+        Crawls every seed in `url_ids` concurrently and closes the browsers afterwards.
+
+        Args:
+            url_ids (list): Identifiers of the Config rows to crawl.
+        """
+
+        self._db_lock = asyncio.Lock()
+        if self.max_pages:
+            self._page_slots = asyncio.Semaphore(self.max_pages)
+
+        async with async_playwright() as p:
+            self._playwright = p
+            try:
+                results = await asyncio.gather(
+                    *(self.crawl_seed(url_id) for url_id in url_ids),
+                    return_exceptions=True,
+                )
+                for url_id, result in zip(url_ids, results):
+                    if isinstance(result, Exception):
+                        self.logger.error(f'Async crawl failed for url_id {url_id}: {result}')
+            finally:
+                for browser in self._browsers.values():
+                    await browser.close()
+                self._browsers = {}
+
+    async def crawl_seed(self, url_id):
+        """
+        Crawls one seed breadth first until `maximum_urls` articles are stored.
+
+        The seed page is searched for article links, then every discovered
+        page is parsed as an article and searched for further links in the
+        same navigation. Page starts are spaced by the Config `delay` column.
+
+        Args:
+            url_id (int): The identifier for the URL configuration in the database.
+        """
+
+        config = await self._config(url_id)
+        if config is None:
+            return
+
+        browser = await self._browser(config.headless)
+        context = await browser.new_context()
+        semaphore = asyncio.Semaphore(config.max_threads)
+        state = {'count': config.count}
+
+        try:
+            links = await self._visit(context, semaphore, canonicalize_url(config.seed_url), config.child_url_xpath,
+                                      config.seed_url_re, config.child_url_re)
+            visited = set(links)
+            frontier = list(links)
+            self.logger.info(f'Found {len(frontier)} child urls from the seed url {config.seed_url}')
+
+            while frontier and state['count'] < config.maximum_urls:
+                if self.configs is not None:
+                    config = self.configs.get(url_id) or config
+                maximum_urls = config.maximum_urls
+                tasks = []
+                for url in frontier:
+                    if state['count'] >= maximum_urls:
+                        break
+                    with self.metrics.timer('sleep'):
+                        await asyncio.sleep(config.delay)
+                    tasks.append(asyncio.create_task(self._visit(
+                        context, semaphore, url, config.child_url_xpath, config.seed_url_re, config.child_url_re,
+                        config.article_title_xpth, config.article_content_xpth, state, maximum_urls,
+                    )))
+
+                next_frontier = []
+                for links in await asyncio.gather(*tasks):
+                    for link in links:
+                        if link not in visited:
+                            visited.add(link)
+                            next_frontier.append(link)
+                frontier = next_frontier
+                self.logger.info(f'{len(frontier)} new child urls for url_id {url_id}')
+
+            if state['count'] >= config.maximum_urls:
+                self.logger.info(f'Threshold reached for url_id {url_id}')
+        finally:
+            await context.close()
+
+    async def _config(self, url_id):
+        if self.configs is not None:
+            return self.configs.get(url_id)
+        async with self._db_lock:
+            config_record = await asyncio.to_thread(self.db.fetch_record_by_url_id, url_id)
+        if not config_record:
+            return None
+        return CrawlConfig.from_record(config_record, self.headless)
+
+    async def _browser(self, headless):
+        browser = self._browsers.get(headless)
+        if browser is None or not browser.is_connected():
+            with self.metrics.timer('browser_launch'):
+                browser = await self._playwright.chromium.launch(headless=headless)
+            self._browsers[headless] = browser
+            self.logger.info(f'Async engine launched a browser (headless={headless})')
+        return browser
+
+    async def _visit(self, context, semaphore, url, child_url_xpath, seed_re, child_re,
+                     article_title_xpth=None, article_content_xpth=None, state=None, maximum_urls=None):
+        async with semaphore:
+            slot = False
+            page = None
+            try:
+                if self._page_slots is not None:
+                    await self._page_slots.acquire()
+                    slot = True
+                page = await context.new_page()
+                self.active_pages += 1
+                formatted_datetime = datetime.now().strftime('%Y:%m:%d %H:%M:%S')
+
+                if not (article_title_xpth and state['count'] < maximum_urls and not self._seen(url)):
+                    article_title_xpth = article_content_xpth = None
+
+                with self.metrics.timer('page'):
+                    with self.metrics.timer('navigation'):
+                        await page.goto(url, timeout=60000)
+                    with self.metrics.timer('dom_load'):
+                        await page.wait_for_load_state('domcontentloaded', timeout=60000)
+                    self.logger.info(f'loaded the url {url}')
+
+                    # Links and article fields come back from a single page.evaluate
+                    with self.metrics.timer('extraction'):
+                        extracted = await extract_page_async(page, child_url_xpath, article_title_xpth, article_content_xpth)
+                self.metrics.inc('pages')
+                if article_title_xpth:
+                    await self._store(url, extracted['title'], extracted['content'], formatted_datetime, state, maximum_urls)
+
+                links = set()
+                for href in extracted['hrefs']:
+                    if href and seed_re.match(href):
+                        links.add(canonicalize_url(href))
+                    if href and child_re.match(href):
+                        links.add(canonicalize_url(urljoin(url, href)))
+                return links
+
+            except TimeoutError as e:
+                self.logger.error(f'Timeout error occurred while navigating to url {url}')
+                self.metrics.inc('errors', type=type(e).__name__)
+                return set()
+
+            except PageError as e:
+                self.logger.error(f'An error occurred with Playwright for url {url}: {e.name} and {e.message}')
+                self.metrics.inc('errors', type=type(e).__name__)
+                return set()
+
+            finally:
+                # Only what was acquired is given back, even if the browser went away meanwhile
+                try:
+                    if page is not None:
+                        self.active_pages -= 1
+                        await page.close()
+                finally:
+                    if slot:
+                        self._page_slots.release()
+
+    async def _store(self, url, title, content, formatted_datetime, state, maximum_urls):
+        if not title or not content or content.isspace():
+            self.logger.info(f'No article content from the url {url}')
+            return
+
+        # Reserve the slot before awaiting the insert so concurrent pages cannot overshoot
+        if state['count'] >= maximum_urls:
+            return
+        if self.near_duplicates is not None:
+            signature = minhash(content)
+            if signature is not None and self.near_duplicates.add(signature) is not None:
+                self.logger.info(f'Article {url} is a near duplicate of a stored article, dropping it')
+                self.metrics.inc('near_duplicates')
+                return
+        state['count'] += 1
+
+        article_details = [url, title, content, formatted_datetime]
+        async with self._db_lock:
+            store = self.sink.store if self.sink is not None else self.db.store_db
+            stored = await asyncio.to_thread(store, article_details)
+        if not stored:
+            state['count'] -= 1
+        elif self.seen_store is not None:
+            self.seen_store.add(url)
+
+    def _seen(self, url):
+        return self.seen_store is not None and url in self.seen_store
@@ -0,0 +1,411 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+import os
+import resource
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import database
+from database import Database
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('benchmark')
+
+
+class FakeCursor:
+    """
+    Cursor that simulates the network round trip of a MySQL server.
+    """
+
+    def __init__(self, latency, row_cost):
+        self.latency = latency
+        self.row_cost = row_cost
+        self.rows = 0
+
+    def execute(self, query, params=None):
+        time.sleep(self.latency + self.row_cost)
+        self.rows += 1
+
+    def executemany(self, query, seq_params):
+        seq_params = list(seq_params)
+        time.sleep(self.latency + self.row_cost * len(seq_params))
+        self.rows += len(seq_params)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """
+    Connection whose commits cost one simulated round trip.
+    """
+
+    def __init__(self, latency, row_cost):
+        self.latency = latency
+        self.row_cost = row_cost
+
+    def cursor(self):
+        return FakeCursor(self.latency, self.row_cost)
+
+    def commit(self):
+        time.sleep(self.latency)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    """
+    Stand-in for `mysql.connector.pooling.MySQLConnectionPool`.
+    """
+
+    def __init__(self, latency, row_cost):
+        self.latency = latency
+        self.row_cost = row_cost
+
+    def get_connection(self):
+        return FakeConnection(self.latency, self.row_cost)
+
+
+def make_fake_database(latency=0.001, row_cost=0.00002):
+    """
+    Returns a `Database` whose connections are fakes with the given costs in seconds.
+    """
+
+    db = Database(logger)
+    db.pool = FakePool(latency, row_cost)
+    db.conn = db.pool.get_connection()
+    db.curr = db.conn.cursor()
+    return db
+
+
+def bench_store_db(rows=5000, threads=8, batch_size=None, flush_interval=0.5, latency=0.001, row_cost=0.00002):
+    """
+    Measures how many article rows per second `Database.store_db` persists.
+
+    `threads` parse threads call `store_db` concurrently, as the crawler does.
+    With `batch_size` set, the write-behind writer is used, otherwise every
+    row is inserted and committed on its own.
+
+    Returns:
+        float: Rows written per second, including the final flush.
+    """
+
+    db = make_fake_database(latency, row_cost)
+    if batch_size:
+        db.start_writer(batch_size=batch_size, flush_interval=flush_interval)
+
+    timestamp = datetime.now().strftime('%Y:%m:%d %H:%M:%S')
+    items = [[f'https://example.com/article/{i}', f'Title {i}', 'content ' * 200, timestamp] for i in range(rows)]
+
+    # The row by row path prints every insert, keep that out of the report
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(db.store_db, items))
+    db.stop_writer()
+    elapsed = time.perf_counter() - start
+
+    assert db.rows_written == rows, f'{db.rows_written} of {rows} rows written'
+    return rows / elapsed
+
+
+class FixtureSite:
+    """
+    Synthetic news site served from a local HTTP server.
+
+    `/<run>/` is the seed page; every page above `depth` links to `fanout`
+    child pages, and every page carries a title and `page_size` bytes of
+    article text. Each response is delayed by `latency` seconds. The `<run>`
+    prefix gives each benchmark run its own URLs, so stores that remember
+    URLs across runs do not skip pages of the next run.
+
+    Args:
+        fanout (int): Number of child links per page.
+        depth (int): Link depth of the deepest pages.
+        page_size (int): Approximate size of the article text in bytes.
+        latency (float): Seconds each response is delayed by.
+    """
+
+    def __init__(self, fanout=5, depth=2, page_size=20000, latency=0.05):
+        self.fanout = fanout
+        self.depth = depth
+        self.page_size = page_size
+        self.latency = latency
+        self.requests = 0
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(site.latency)
+                body = site.render(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                site.requests += 1
+                body = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever, name='fixture-site', daemon=True)
+        self._thread.start()
+
+    @property
+    def articles(self):
+        """
+        Number of pages below the seed page.
+        """
+
+        return sum(self.fanout ** level for level in range(1, self.depth + 1))
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.port}{path}'
+
+    def render(self, path):
+        if path == '/robots.txt':
+            return ''
+        parts = path.strip('/').split('/')
+        if len(parts) == 1:
+            run, page = parts[0], []
+        elif len(parts) == 3 and parts[1] == 'p':
+            run, page = parts[0], parts[2].split('-')
+        else:
+            return None
+
+        links = ''
+        if len(page) < self.depth:
+            links = ''.join(
+                f'<li><a class="child" href="/{run}/p/{"-".join(page + [str(i)])}">Story {i}</a></li>'
+                for i in range(self.fanout)
+            )
+        sentence = f'Synthetic article {"-".join(page) or "front"} of run {run}. '
+        text = sentence * max(1, self.page_size // len(sentence))
+        return (
+            f'<html><head><title>Fixture</title></head><body>'
+            f'<h1 class="headline">Article {"-".join(page) or "front page"}</h1>'
+            f'<ul>{links}</ul><div class="content"><p>{text}</p></div></body></html>'
+        )
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FixtureDatabase(Database):
+    """
+    `Database` serving Config rows for the fixture site and storing into fake connections.
+
+    Rows are added with `add_config`; inserts go through the regular write
+    path against `FakePool`, so batching costs are kept.
+    """
+
+    configs = {}
+
+    def create_connection(self, pool_size=1):
+        self.pool = FakePool(0.001, 0.00002)
+        self.conn = self.pool.get_connection()
+        self.curr = self.conn.cursor()
+
+    def fetch_url_ids(self):
+        return list(self.configs)
+
+    def fetch_configs(self):
+        return list(self.configs.values())
+
+    def fetch_article_urls(self):
+        return []
+
+    def fetch_record_by_url_id(self, url_id):
+        return self.configs.get(url_id)
+
+    @classmethod
+    def add_config(cls, url_id, seed_url, max_threads, maximum_urls, fetch_mode):
+        cls.configs[url_id] = (
+            url_id, seed_url, max_threads, maximum_urls, 0,
+            '//a[@class="child"]', '//h1[@class="headline"]', '//div[@class="content"]//p',
+            r'^https?://', r'^/', 0, 1, fetch_mode,
+        )
+
+
+class ProcessSampler:
+    """
+    Samples the browser processes below this process and their memory.
+
+    Child processes are found through /proc, so the figures stay None on
+    systems without it. Peak RSS of this process comes from `getrusage`.
+    """
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak_children = None
+        self.peak_children_rss = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='process-sampler', daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _children():
+        parents = {}
+        for pid in os.listdir('/proc'):
+            if not pid.isdigit():
+                continue
+            try:
+                with open(f'/proc/{pid}/stat', 'rb') as f:
+                    # The command name may contain spaces, the parent pid follows its closing parenthesis
+                    parents[int(pid)] = int(f.read().rsplit(b')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+        descendants, pending = [], [os.getpid()]
+        while pending:
+            parent = pending.pop()
+            for pid, ppid in parents.items():
+                if ppid == parent:
+                    descendants.append(pid)
+                    pending.append(pid)
+        return descendants
+
+    @staticmethod
+    def _rss_kib(pid):
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return 0
+
+    def _run(self):
+        if not os.path.isdir('/proc'):
+            return
+        while not self._stop.wait(self.interval):
+            children = self._children()
+            rss = sum(self._rss_kib(pid) for pid in children)
+            self.peak_children = max(self.peak_children or 0, len(children))
+            self.peak_children_rss = max(self.peak_children_rss or 0, rss)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+    @staticmethod
+    def peak_rss_mib():
+        # ru_maxrss is in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_db_benchmark(args):
+    print(f'store_db with {args.rows} rows, {args.threads} threads, {args.latency * 1000:.1f} ms round trip')
+    baseline = bench_store_db(args.rows, args.threads, None, latency=args.latency)
+    print(f'  row by row            : {baseline:10.0f} rows/sec')
+    for batch_size in args.batch_sizes:
+        rate = bench_store_db(args.rows, args.threads, batch_size, latency=args.latency)
+        print(f'  batch size {batch_size:<10} : {rate:10.0f} rows/sec ({rate / baseline:.1f}x)')
+
+
+def run_site_benchmark(args):
+    """
+    Crawls the fixture site end to end with each engine and reports throughput and resources.
+
+    `multiple_seedurls` is imported with `FixtureDatabase` in place of
+    `Database` and from a temporary directory, so its seen, validator and
+    checkpoint stores and its log start empty and never touch the real ones.
+    """
+
+    site = FixtureSite(args.fanout, args.depth, args.page_size, args.latency)
+    print(f'fixture site with fan-out {args.fanout}, depth {args.depth}, {args.page_size} byte pages, '
+          f'{args.latency * 1000:.0f} ms latency: {site.articles} articles')
+
+    database.Database = FixtureDatabase
+    workdir = tempfile.mkdtemp(prefix='crawler-bench-')
+    os.chdir(workdir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import multiple_seedurls as crawler
+    crawler.MAX_DEPTH = args.depth
+    crawler.metrics.keep_samples = True
+
+    sampler = ProcessSampler()
+    try:
+        for run_id, engine in enumerate(args.engines, start=1):
+            FixtureDatabase.add_config(run_id, site.url(f'/run{run_id}/'), args.threads, site.articles,
+                                       'browser' if engine == 'async' else engine.split('-')[1])
+            crawler.config_store.reload()
+            crawler.metrics.reset()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                if engine == 'async':
+                    async_crawler = crawler.AsyncCrawler(crawler.logger, crawler.db_instance, headless=True,
+                                                         max_pages=crawler.BROWSER_POOL_SIZE, metrics=crawler.metrics,
+                                                         sink=crawler.article_pipeline)
+                    asyncio.run(async_crawler.crawl([run_id]))
+                else:
+                    crawler.main(run_id)
+                crawler.article_pipeline.flush()
+            elapsed = time.perf_counter() - start
+
+            pages = crawler.metrics.counter('pages')
+            p50 = crawler.metrics.percentile('page', 0.5)
+            p99 = crawler.metrics.percentile('page', 0.99)
+            print(f'  {engine:<15}: {pages / elapsed:7.1f} pages/sec, {pages} pages in {elapsed:.1f}s, '
+                  f'p50 {p50 * 1000 if p50 is not None else float("nan"):.0f} ms, '
+                  f'p99 {p99 * 1000 if p99 is not None else float("nan"):.0f} ms, '
+                  f'errors {crawler.metrics.counter("errors")}')
+    finally:
+        sampler.close()
+        with contextlib.redirect_stdout(io.StringIO()):
+            crawler.scheduler.close()
+            crawler.browser_pool.close()
+            crawler.http_fetcher.close()
+            crawler.seen_store.close()
+            crawler.validator_store.close()
+            crawler.dead_letters.close()
+            crawler.article_pipeline.close()
+            crawler.db_instance.close_database()
+        site.close()
+
+    print(f'peak RSS {ProcessSampler.peak_rss_mib():.0f} MiB in the crawler process, '
+          f'{(sampler.peak_children_rss or 0) / 1024:.0f} MiB across at most {sampler.peak_children} browser processes')
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Offline benchmarks for the crawler.')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    db_parser = subparsers.add_parser('db', help='rows/sec of Database.store_db against a fake connector')
+    db_parser.add_argument('--rows', type=int, default=5000)
+    db_parser.add_argument('--threads', type=int, default=8)
+    db_parser.add_argument('--latency', type=float, default=0.001, help='simulated round trip in seconds')
+    db_parser.add_argument('--batch-sizes', type=int, nargs='+', default=[10, 100, 500])
+    db_parser.set_defaults(func=run_db_benchmark)
+
+    site_parser = subparsers.add_parser('site', help='end-to-end crawl of a local fixture site with a fake database')
+    site_parser.add_argument('--fanout', type=int, default=5)
+    site_parser.add_argument('--depth', type=int, default=2)
+    site_parser.add_argument('--page-size', type=int, default=20000, help='article text bytes per page')
+    site_parser.add_argument('--latency', type=float, default=0.05, help='server response delay in seconds')
+    site_parser.add_argument('--threads', type=int, default=4, help='max_threads of the fixture Config rows')
+    site_parser.add_argument('--engines', nargs='+', default=['threads-http', 'threads-browser', 'async'],
+                             choices=['threads-http', 'threads-browser', 'threads-auto', 'async'])
+    site_parser.set_defaults(func=run_site_benchmark)
+
+    args = parser.parse_args()
+    args.func(args)
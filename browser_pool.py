@@ -0,0 +1,332 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from urllib.parse import urlsplit
+
+from playwright.sync_api import sync_playwright, Error as PageError
+
+from metrics import Metrics
+
+BLOCKED_RESOURCE_TYPES = ('image', 'media', 'font', 'stylesheet')
+
+# Ad, tracking and analytics domains; subdomains are blocked as well
+BLOCKED_DOMAINS = (
+    'doubleclick.net', 'googlesyndication.com', 'googleadservices.com', 'google-analytics.com',
+    'googletagmanager.com', 'googletagservices.com', 'adservice.google.com', 'amazon-adsystem.com',
+    'facebook.net', 'connect.facebook.net', 'scorecardresearch.com', 'chartbeat.com', 'chartbeat.net',
+    'taboola.com', 'outbrain.com', 'criteo.com', 'adnxs.com', 'rubiconproject.com', 'pubmatic.com',
+    'quantserve.com', 'hotjar.com', 'segment.io', 'newrelic.com', 'nr-data.net', 'permutive.com',
+)
+
+
+def _site(host):
+    """
+    Approximates the registrable domain of `host` by its last two labels.
+    """
+
+    return '.'.join(host.rsplit('.', 2)[-2:])
+
+
+class PageLoadStats:
+    """
+    Thread-safe page load figures of one seed.
+
+    Pool workers add the wall time of every job and the requests their route
+    handler blocked, so a seed's stats cover every page loaded for it.
+    """
+
+    def __init__(self):
+        self.pages = 0
+        self.load_seconds = 0.0
+        self.blocked = Counter()
+        self._lock = threading.Lock()
+
+    def record_page(self, seconds):
+        with self._lock:
+            self.pages += 1
+            self.load_seconds += seconds
+
+    def record_blocked(self, reason):
+        with self._lock:
+            self.blocked[reason] += 1
+
+    def summary(self):
+        with self._lock:
+            average = self.load_seconds / self.pages if self.pages else 0.0
+            blocked = ', '.join(f'{reason}={count}' for reason, count in self.blocked.most_common()) or 'none'
+            return f'{self.pages} pages, {average:.2f}s average load, blocked requests: {blocked}'
+
+
+class _BrowserSlot:
+    """
+    A launched browser together with the context and page a pool worker reuses.
+    """
+
+    __slots__ = ('browser', 'context', 'page', 'pages_served', 'stats')
+
+    def __init__(self, browser, context, page):
+        self.browser = browser
+        self.context = context
+        self.page = page
+        self.pages_served = 0
+        self.stats = None
+
+    def is_healthy(self):
+        return self.browser.is_connected() and not self.page.is_closed()
+
+    def close(self):
+        for closeable in (self.page, self.context, self.browser):
+            try:
+                closeable.close()
+            except PageError:
+                pass
+
+
+class BrowserPool:
+    """
+    Long-lived pool of Chromium browsers shared by every crawl thread.
+
+    Playwright's sync API is bound to the thread that started it, so each pool
+    worker owns its own Playwright instance and keeps one browser, context and
+    page alive between jobs. Crawl threads hand work to the pool with `run`,
+    which executes a callable against a worker's page and returns its result.
+    Before every job the worker health-checks its browser, and it recycles the
+    browser after `pages_per_browser` jobs or as soon as the browser crashes.
+
+    Every context routes its requests through a handler that aborts the
+    resource types in `block_resource_types`, requests to `block_domains`
+    and, optionally, scripts served from another site than the page, so
+    pages only download what the article extraction needs.
+
+    Args:
+        log (logging.Logger): Logger used for pool lifecycle messages.
+        size (int): Number of pool workers, i.e. the maximum number of pages
+            rendering at the same time.
+        headless (bool): Default headless mode for jobs that do not set one.
+        pages_per_browser (int): Number of jobs after which a browser is
+            closed and relaunched.
+        block_resource_types (iterable): Playwright resource types to abort.
+        block_domains (iterable): Domains whose requests are aborted.
+        block_third_party_scripts (bool): Whether scripts from other sites are aborted.
+        metrics (Metrics, optional): Receives browser launch timings. The
+            pool's `active` and `browsers` attributes count running jobs and
+            launched browsers.
+    """
+
+    def __init__(self, log, size=4, headless=False, pages_per_browser=50,
+                 block_resource_types=(), block_domains=(), block_third_party_scripts=False, metrics=None):
+        self.logger = log
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.active = 0
+        self.browsers = 0
+        self._counts_lock = threading.Lock()
+        self.size = size
+        self.headless = headless
+        self.pages_per_browser = pages_per_browser
+        self.block_resource_types = frozenset(block_resource_types)
+        self.block_domains = tuple(domain.lower().lstrip('.') for domain in block_domains)
+        self.block_third_party_scripts = block_third_party_scripts
+        self._jobs = queue.Queue()
+        self._closed = False
+        self._workers = []
+        for worker_id in range(size):
+            worker = threading.Thread(
+                target=self._worker_loop,
+                args=(worker_id,),
+                name=f'browser-pool-{worker_id}',
+                daemon=True,
+            )
+            worker.start()
+            self._workers.append(worker)
+        self.logger.info(f'Browser pool started with {size} workers')
+
+    def submit(self, fn, *args, headless=None, stats=None):
+        """
+        Schedules `fn(page, *args)` on the next free pool worker.
+
+        Args:
+            fn (callable): Function receiving a Playwright page as its first argument.
+            *args: Extra positional arguments passed to `fn`.
+            headless (bool, optional): Headless mode for the browser running
+                the job. Defaults to the pool's `headless` setting.
+            stats (PageLoadStats, optional): Receives the job's load time
+                and blocked requests.
+
+        Returns:
+            concurrent.futures.Future: Future resolved with the return value of `fn`.
+
+        Raises:
+            RuntimeError: If the pool has already been closed.
+        """
+
+        if self._closed:
+            raise RuntimeError('Browser pool is closed')
+        future = Future()
+        if headless is None:
+            headless = self.headless
+        self._jobs.put((fn, args, bool(headless), stats, future))
+        return future
+
+    def run(self, fn, *args, headless=None, stats=None):
+        """
+        Runs `fn(page, *args)` on a pool worker and waits for its result.
+
+        Exceptions raised by `fn`, such as Playwright's `TimeoutError`, are
+        re-raised in the calling thread.
+        """
+
+        return self.submit(fn, *args, headless=headless, stats=stats).result()
+
+    def close(self):
+        """
+        Stops every worker and closes the browsers they own.
+        """
+
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._workers:
+            self._jobs.put(None)
+        for worker in self._workers:
+            worker.join()
+        self.logger.info('Browser pool closed')
+
+    def compare_blocking(self, url, wait_until='domcontentloaded', headless=None):
+        """
+        Loads `url` once without and once with request blocking.
+
+        Each load uses a fresh context so neither benefits from the other's
+        cache. Response body sizes are read from Playwright's request sizes.
+
+        Returns:
+            dict: `bytes` and `seconds` of the unblocked (`full_*`) and blocked
+            (`lean_*`) loads, plus the number of `blocked_requests`.
+        """
+
+        return self.run(self._compare_blocking, url, wait_until, headless=headless)
+
+    def _compare_blocking(self, page, url, wait_until):
+        browser = page.context.browser
+        result = {}
+        for label, blocking in (('full', False), ('lean', True)):
+            context = browser.new_context()
+            stats = PageLoadStats()
+            if blocking:
+                context.route('**/*', self._route_handler(stats))
+            measured_page = context.new_page()
+            body_bytes = []
+            measured_page.on('requestfinished', lambda request: body_bytes.append(request.sizes()['responseBodySize']))
+            try:
+                start = time.perf_counter()
+                measured_page.goto(url, wait_until=wait_until, timeout=60000)
+                result[f'{label}_seconds'] = time.perf_counter() - start
+                result[f'{label}_bytes'] = sum(size for size in body_bytes if size > 0)
+                if blocking:
+                    result['blocked_requests'] = sum(stats.blocked.values())
+            finally:
+                context.close()
+        return result
+
+    def _block_reason(self, request):
+        resource_type = request.resource_type
+        if resource_type in self.block_resource_types:
+            return resource_type
+
+        host = (urlsplit(request.url).hostname or '').lower()
+        for domain in self.block_domains:
+            if host == domain or host.endswith('.' + domain):
+                return 'ad/analytics'
+
+        if self.block_third_party_scripts and resource_type == 'script':
+            try:
+                page_host = urlsplit(request.frame.url).hostname or ''
+            except PageError:
+                return None
+            if page_host and _site(page_host.lower()) != _site(host):
+                return 'third-party script'
+        return None
+
+    def _route_handler(self, stats_source):
+        def handle(route):
+            reason = self._block_reason(route.request)
+            if reason is None:
+                route.continue_()
+                return
+            stats = stats_source.stats if isinstance(stats_source, _BrowserSlot) else stats_source
+            if stats is not None:
+                stats.record_blocked(reason)
+            route.abort()
+        return handle
+
+    def _count(self, name, delta):
+        with self._counts_lock:
+            setattr(self, name, getattr(self, name) + delta)
+
+    def _launch(self, playwright, headless):
+        with self.metrics.timer('browser_launch'):
+            browser = playwright.chromium.launch(headless=headless)
+            context = browser.new_context()
+            page = context.new_page()
+        slot = _BrowserSlot(browser, context, page)
+        if self.block_resource_types or self.block_domains or self.block_third_party_scripts:
+            context.route('**/*', self._route_handler(slot))
+        return slot
+
+    def _worker_loop(self, worker_id):
+        playwright = None
+        slots = {}
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    break
+                fn, args, headless, stats, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+
+                slot = slots.get(headless)
+                try:
+                    if slot is not None and not slot.is_healthy():
+                        self.logger.warning(f'Browser pool worker {worker_id} found a crashed browser, relaunching')
+                        slot.close()
+                        self._count('browsers', -1)
+                        slot = None
+                    if slot is None:
+                        if playwright is None:
+                            playwright = sync_playwright().start()
+                        slot = self._launch(playwright, headless)
+                        slots[headless] = slot
+                        self._count('browsers', 1)
+                        self.logger.info(f'Browser pool worker {worker_id} launched a browser (headless={headless})')
+                except Exception as e:
+                    slots.pop(headless, None)
+                    future.set_exception(e)
+                    continue
+
+                slot.stats = stats
+                self._count('active', 1)
+                start = time.perf_counter()
+                try:
+                    future.set_result(fn(slot.page, *args))
+                except BaseException as e:
+                    future.set_exception(e)
+                finally:
+                    self._count('active', -1)
+                    if stats is not None:
+                        stats.record_page(time.perf_counter() - start)
+                    slot.stats = None
+
+                slot.pages_served += 1
+                if slot.pages_served >= self.pages_per_browser or not slot.is_healthy():
+                    self.logger.info(f'Browser pool worker {worker_id} recycling browser after {slot.pages_served} pages')
+                    slot.close()
+                    self._count('browsers', -1)
+                    del slots[headless]
+        finally:
+            for slot in slots.values():
+                slot.close()
+                self._count('browsers', -1)
+            if playwright is not None:
+                playwright.stop()
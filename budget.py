@@ -0,0 +1,108 @@
+import threading
+
+
+class Reservation:
+    """
+    One article slot taken from a budget before its page is fetched.
+
+    The slot is either committed once the article is stored or released,
+    and only the first of the two calls has an effect, so a caller may
+    always release a reservation when the fetch is over.
+    """
+
+    __slots__ = ('budget', 'settled')
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.settled = False
+
+    def commit(self):
+        """
+        Counts the slot as a stored article.
+
+        Returns:
+            int: Number of stored articles after the commit.
+        """
+
+        if self.settled:
+            return self.budget.used
+        self.settled = True
+        return self.budget.commit()
+
+    def release(self):
+        if not self.settled:
+            self.settled = True
+            self.budget.release()
+
+
+class CrawlBudget:
+    """
+    Article quota of one url_id, shared by every thread crawling it.
+
+    A fetch that may store an article reserves a slot first, so stored and
+    reserved articles together never exceed `limit` and no page is fetched
+    for an article that could not be stored anyway. Once `limit` articles
+    are stored, every tracked future that has not started yet is cancelled.
+
+    Args:
+        limit (int): Maximum number of stored articles, or None for no limit.
+        used (int): Number of articles already stored.
+    """
+
+    def __init__(self, limit=None, used=0):
+        self.limit = limit
+        self.used = used
+        self.reserved = 0
+        self._futures = set()
+        self._lock = threading.Lock()
+
+    @property
+    def exhausted(self):
+        return self.limit is not None and self.used >= self.limit
+
+    def reserve(self):
+        """
+        Takes a slot for an article about to be fetched.
+
+        Returns:
+            Reservation: The reserved slot, or None if every slot is stored or reserved.
+        """
+
+        with self._lock:
+            if self.limit is not None and self.used + self.reserved >= self.limit:
+                return None
+            self.reserved += 1
+        return Reservation(self)
+
+    def commit(self):
+        with self._lock:
+            self.reserved -= 1
+            self.used += 1
+            used = self.used
+        if self.exhausted:
+            self.cancel_pending()
+        return used
+
+    def release(self):
+        with self._lock:
+            self.reserved -= 1
+
+    def track(self, future):
+        """
+        Cancels `future` once the budget is exhausted, unless it is already running.
+        """
+
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._forget)
+        if self.exhausted:
+            future.cancel()
+
+    def _forget(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def cancel_pending(self):
+        with self._lock:
+            futures = list(self._futures)
+        return sum(future.cancel() for future in futures)
@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+import time
+
+
+class ResumeState:
+    """
+    Crawl progress of one Config row rebuilt from a checkpoint log.
+
+    Attributes:
+        visited (set): Every URL ever queued for the seed.
+        pending (dict): URL to depth of queued URLs that were never finished.
+        count (int): Last checkpointed number of stored articles.
+        finished (bool): Whether the seed's crawl ran to completion.
+    """
+
+    def __init__(self):
+        self.visited = set()
+        self.pending = {}
+        self.count = None
+        self.finished = False
+
+
+class CheckpointStore:
+    """
+    Append-only log of per-seed crawl progress used to resume a crawl.
+
+    Every URL pushed to a seed's frontier is logged as a `push` event and
+    every URL whose visit completed as a `done` event, so the frontier and
+    the visited set of a seed can be rebuilt by replaying the log: visited
+    URLs are all pushed URLs and the frontier is those not done yet. Article
+    counters of the tracked seeds are logged as `count` events.
+
+    Events are buffered and appended to the file at most every `interval`
+    seconds, then fsynced, so a crash loses at most that much progress and a
+    partially written last line is ignored on load.
+
+    Args:
+        path (str): Path of the JSONL log.
+        interval (float): Seconds between two flushes to disk.
+        log (logging.Logger, optional): Logger used for checkpoint messages.
+    """
+
+    def __init__(self, path, interval=30.0, log=None):
+        self.path = path
+        self.interval = interval
+        self.logger = log
+        self._buffer = []
+        self._states = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._file = None
+
+    def start(self, resume=False):
+        """
+        Opens the log, truncating it unless the crawl is resumed.
+        """
+
+        self._file = open(self.path, 'a' if resume else 'w', encoding='utf-8')
+
+    def load(self):
+        """
+        Replays the log.
+
+        Returns:
+            dict: url_id to `ResumeState`.
+        """
+
+        states = {}
+        if not os.path.exists(self.path):
+            return states
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash may leave the last line half written
+                    continue
+                state = states.setdefault(event['u'], ResumeState())
+                kind = event['e']
+                if kind == 'push':
+                    state.visited.add(event['url'])
+                    state.pending[event['url']] = event['d']
+                elif kind == 'done':
+                    state.pending.pop(event['url'], None)
+                elif kind == 'count':
+                    state.count = event['n']
+                elif kind == 'finished':
+                    state.finished = True
+        return states
+
+    def track(self, state):
+        """
+        Registers a `CrawlState` whose counter is logged on every flush.
+        """
+
+        with self._lock:
+            self._states[state.url_id] = state
+
+    def record_push(self, url_id, url, depth):
+        self._record({'u': url_id, 'e': 'push', 'url': url, 'd': depth})
+
+    def record_done(self, url_id, url):
+        self._record({'u': url_id, 'e': 'done', 'url': url})
+
+    def record_finished(self, url_id):
+        self._record({'u': url_id, 'e': 'finished'})
+        self.flush()
+
+    def _record(self, event):
+        with self._lock:
+            if self._file is None:
+                return
+            self._buffer.append(event)
+            due = time.monotonic() - self._last_flush >= self.interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Appends the buffered events and the tracked counters to the log.
+        """
+
+        with self._lock:
+            if self._file is None:
+                return
+            events = self._buffer
+            self._buffer = []
+            events.extend({'u': url_id, 'e': 'count', 'n': state.count} for url_id, state in self._states.items())
+            self._file.write(''.join(json.dumps(event) + '\n' for event in events))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._last_flush = time.monotonic()
+        if self.logger:
+            self.logger.info(f'Checkpointed {len(events)} crawl events to {self.path}')
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,199 @@
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+from metrics import Metrics
+
+# Outcomes reported to `ConcurrencyController.record`
+OK = 'ok'
+TIMEOUT = 'timeout'
+ERROR = 'error'
+THROTTLED = 'throttled'
+
+BACKOFF_OUTCOMES = (TIMEOUT, ERROR, THROTTLED)
+
+
+def available_memory():
+    """
+    Returns the bytes of memory available to new processes, or None if unknown.
+
+    Reads MemAvailable from /proc/meminfo and falls back to the free physical
+    pages reported by `os.sysconf` on other Unix systems.
+    """
+
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def page_capacity(memory_per_page=300 * 1024 * 1024, pages_per_cpu=1, memory_share=0.75):
+    """
+    Returns how many browser pages this machine can render at the same time.
+
+    Args:
+        memory_per_page (int): Bytes one rendering page with its browser needs.
+        pages_per_cpu (int): Pages rendered at once per CPU.
+        memory_share (float): Share of the available memory given to pages.
+    """
+
+    capacity = (os.cpu_count() or 1) * pages_per_cpu
+    memory = available_memory()
+    if memory is not None:
+        capacity = min(capacity, int(memory * memory_share // memory_per_page))
+    return max(1, capacity)
+
+
+class _HostLimit:
+    """
+    Concurrency limit and latency figures of a single host.
+    """
+
+    __slots__ = ('limit', 'ceiling', 'latency', 'baseline', 'last_backoff')
+
+    def __init__(self, limit, ceiling):
+        self.limit = float(limit)
+        self.ceiling = float(ceiling)
+        self.latency = None
+        self.baseline = None
+        self.last_backoff = float('-inf')
+
+
+class ConcurrencyController:
+    """
+    AIMD limit on the number of pages of each host fetched at the same time.
+
+    Every successful fetch whose latency stays within `latency_tolerance`
+    times the host's baseline adds `increase / limit` to the host's limit,
+    so the limit grows by `increase` per round of `limit` fetches. A
+    timeout, a browser error, an HTTP 429 or 503, or latency rising past the
+    tolerance multiplies the limit by `decrease`, at most once per `cooldown`
+    seconds so a burst of failures from the same round only backs off once.
+    Limits stay between `min_limit` and the host's ceiling, which is
+    `max_limit`, the global cap, unless `start` sets a lower hard cap.
+
+    The baseline is the lowest smoothed latency seen for the host, drifting
+    slowly upwards so a site that becomes slower for good does not stay
+    throttled forever.
+
+    Args:
+        log (logging.Logger): Logger used for limit changes.
+        max_limit (int): Highest limit of any host.
+        min_limit (int): Lowest limit of any host.
+        increase (float): Additive increase per round of successful fetches.
+        decrease (float): Multiplicative decrease on backoff.
+        latency_tolerance (float): Latency over baseline ratio treated as overload.
+        cooldown (float): Minimum seconds between two backoffs of a host.
+        metrics (Metrics, optional): Receives backoff counts by outcome.
+    """
+
+    def __init__(self, log, max_limit, min_limit=1, increase=1.0, decrease=0.5, latency_tolerance=2.0, cooldown=5.0,
+                 metrics=None):
+        self.logger = log
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host(url):
+        return urlsplit(url).netloc.lower()
+
+    def start(self, host, initial, ceiling=None):
+        """
+        Registers `host` with its starting limit and optional hard cap.
+
+        A new host starts at `initial`, typically its Config `max_threads`,
+        or at `min_limit` without one, and may then grow up to `ceiling`, or
+        up to `max_limit` without one. For a known host only the ceiling is
+        updated; a lowered ceiling cuts the current limit right away, so
+        edits reach running crawls.
+        """
+
+        with self._lock:
+            state = self._hosts.get(host)
+            top = self._clamp(ceiling, self.max_limit) if ceiling else float(self.max_limit)
+            if state is None:
+                self._hosts[host] = _HostLimit(self._clamp(initial or self.min_limit, top), top)
+            else:
+                state.ceiling = top
+                state.limit = min(state.limit, top)
+
+    def limit(self, host):
+        """
+        Returns the whole number of fetches `host` may have running.
+        """
+
+        with self._lock:
+            state = self._hosts.get(host)
+            return int(state.limit) if state else self.min_limit
+
+    def total(self):
+        with self._lock:
+            return sum(int(state.limit) for state in self._hosts.values())
+
+    def record(self, url, outcome, seconds=None):
+        """
+        Adjusts the limit of the host of `url` after a fetch.
+
+        Args:
+            url (str): URL that was fetched.
+            outcome (str): `OK`, `TIMEOUT`, `ERROR` or `THROTTLED`.
+            seconds (float, optional): Duration of a successful fetch.
+        """
+
+        host = self.host(url)
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = self._hosts[host] = _HostLimit(self.min_limit, self.max_limit)
+            before = int(state.limit)
+
+            if outcome == OK:
+                overloaded = False
+                if seconds is not None:
+                    state.latency = seconds if state.latency is None else 0.8 * state.latency + 0.2 * seconds
+                    if state.baseline is None or state.latency < state.baseline:
+                        state.baseline = state.latency
+                    else:
+                        state.baseline += (state.latency - state.baseline) * 0.01
+                    overloaded = state.latency > self.latency_tolerance * state.baseline
+                if overloaded:
+                    backoff = self._backoff(state, 'latency')
+                else:
+                    backoff = None
+                    state.limit = self._clamp(state.limit + self.increase / state.limit, state.ceiling)
+            elif outcome in BACKOFF_OUTCOMES:
+                backoff = self._backoff(state, outcome)
+            else:
+                return
+            after = int(state.limit)
+
+        if backoff:
+            self.metrics.inc('concurrency_backoffs', reason=backoff)
+        if after != before:
+            self.logger.info(f'Concurrency limit of {host}: {before} -> {after}' + (f' ({backoff})' if backoff else ''))
+
+    def _backoff(self, state, reason):
+        now = time.monotonic()
+        if now - state.last_backoff < self.cooldown:
+            return None
+        state.last_backoff = now
+        state.limit = self._clamp(state.limit * self.decrease, state.ceiling)
+        return reason
+
+    def _clamp(self, limit, ceiling):
+        return min(float(ceiling), float(self.max_limit), max(float(self.min_limit), limit))
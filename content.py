@@ -0,0 +1,63 @@
+import re
+
+# Longest article text kept, in characters after whitespace is collapsed
+MAX_ARTICLE_CHARS = 100_000
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(fragments, max_chars=MAX_ARTICLE_CHARS):
+    """
+    Joins text fragments into one line of text of at most `max_chars` characters.
+
+    Every run of whitespace, newlines included, becomes a single space and
+    fragments are separated by one space. Fragments are consumed one at a
+    time and the rest are never read once the cap is reached, so a generator
+    over a huge page is never joined in full. A cut text ends at the last
+    whole word before the cap.
+
+    Args:
+        fragments (iterable): Strings in document order; None items are skipped.
+        max_chars (int): Maximum length of the result, or None for no limit.
+
+    Returns:
+        str: The normalized text.
+    """
+
+    parts = []
+    length = 0
+    for fragment in fragments:
+        if not fragment:
+            continue
+        clipped = False
+        if max_chars is not None:
+            # Only a bounded prefix is collapsed; whitespace-heavy fragments may shrink by half
+            fragment = fragment.lstrip()
+            limit = 2 * (max_chars - length) + 1
+            clipped = len(fragment) > limit
+            fragment = fragment[:limit]
+        text = _WHITESPACE.sub(' ', fragment).strip()
+        if not text:
+            if clipped:
+                # The fragment's text lies past the prefix; skipping it would put the next one out of order
+                break
+            continue
+        if parts:
+            text = ' ' + text
+        if max_chars is not None and (clipped or length + len(text) > max_chars):
+            room = max_chars - length
+            if len(text) > room and text[room] == ' ':
+                # The last word ends exactly at the cap
+                parts.append(text[:room])
+                break
+            text = text[:room]
+            cut = text.rfind(' ')
+            if cut > 0:
+                parts.append(text[:cut])
+            elif cut < 0:
+                # A single word longer than the cap is cut inside the word
+                parts.append(text)
+            break
+        parts.append(text)
+        length += len(text)
+    return ''.join(parts).strip()
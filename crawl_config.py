@@ -0,0 +1,174 @@
+import re
+import threading
+import time
+
+from http_fetcher import FETCH_MODES
+
+
+class CrawlConfig:
+    """
+    One row of the Config table with its URL patterns compiled once.
+
+    Args:
+        url_id (int): Identifier for the URL configuration in the database.
+        seed_url (str): URL the crawl starts from.
+        max_threads (int): Number of pages of the seed fetched at the same
+            time, the starting point of the adaptive per-host limit.
+        maximum_urls (int): Maximum number of articles stored for the seed.
+        count (int): Number of articles already stored for the seed.
+        child_url_xpath (str): XPath to locate child URLs.
+        article_title_xpth (str): XPath to locate the article title.
+        article_content_xpth (str): XPath to locate the article content.
+        seed_url_re (re.Pattern): Pattern matching seed URLs.
+        child_url_re (re.Pattern): Pattern matching child URLs.
+        delay (float): Minimum delay in seconds between two requests to the same host.
+        headless (bool): Whether the browser runs headless for this seed.
+        fetch_mode (str): 'browser', 'http' or 'auto'.
+        sitemap_urls (list): Sitemaps listing the seed's articles; empty to
+            look them up in robots.txt.
+        max_concurrency (int, optional): Hard cap on the pages of the seed's
+            host fetched at the same time; None to let the limit grow up to
+            the global cap.
+    """
+
+    __slots__ = (
+        'url_id', 'seed_url', 'max_threads', 'maximum_urls', 'count',
+        'child_url_xpath', 'article_title_xpth', 'article_content_xpth',
+        'seed_url_re', 'child_url_re', 'delay', 'headless', 'fetch_mode', 'sitemap_urls',
+        'max_concurrency',
+    )
+
+    def __init__(self, url_id, seed_url, max_threads, maximum_urls, count, child_url_xpath, article_title_xpth,
+                 article_content_xpth, seed_url_re, child_url_re, delay, headless, fetch_mode, sitemap_urls=(),
+                 max_concurrency=None):
+        self.url_id = url_id
+        self.seed_url = seed_url
+        self.max_threads = max_threads
+        self.maximum_urls = maximum_urls
+        self.count = count
+        self.child_url_xpath = child_url_xpath
+        self.article_title_xpth = article_title_xpth
+        self.article_content_xpth = article_content_xpth
+        self.seed_url_re = seed_url_re
+        self.child_url_re = child_url_re
+        self.delay = delay
+        self.headless = headless
+        self.fetch_mode = fetch_mode
+        self.sitemap_urls = list(sitemap_urls)
+        self.max_concurrency = max_concurrency
+
+    @classmethod
+    def from_record(cls, record, headless=False, fetch_mode='auto'):
+        """
+        Builds a config from a `SELECT * FROM Config` row.
+
+        The optional `headless` and `fetch_mode` columns fall back to the
+        given defaults when the table lacks them or they are NULL. The
+        optional `sitemap_url` column holds whitespace separated sitemap URLs
+        and the optional `max_concurrency` column a per-host hard cap.
+
+        Raises:
+            re.error: If a URL pattern does not compile.
+        """
+
+        if len(record) > 11 and record[11] is not None:
+            headless = bool(record[11])
+        if len(record) > 12 and record[12] in FETCH_MODES:
+            fetch_mode = record[12]
+        sitemap_urls = record[13].split() if len(record) > 13 and record[13] else []
+        max_concurrency = int(record[14]) if len(record) > 14 and record[14] else None
+        return cls(
+            record[0], record[1], record[2], record[3], record[4], record[5], record[6], record[7],
+            re.compile(record[8]), re.compile(record[9]), record[10], headless, fetch_mode, sitemap_urls,
+            max_concurrency,
+        )
+
+    def __repr__(self):
+        return f'CrawlConfig(url_id={self.url_id!r}, seed_url={self.seed_url!r})'
+
+
+class ConfigStore:
+    """
+    Every Config row, loaded with one query and refreshed once it is `ttl` seconds old.
+
+    Crawl loops look their config up on every round, so edits to the Config
+    table reach running crawls within `ttl` seconds, or right away after
+    `reload`. If a reload fails, the previous configs are kept.
+
+    Args:
+        db (Database): Connected database providing `fetch_configs`.
+        log (logging.Logger): Logger used for reload messages.
+        ttl (float): Seconds a loaded config stays fresh.
+        headless (bool): Headless mode for rows without a headless column.
+        fetch_mode (str): Fetch mode for rows without a fetch_mode column.
+    """
+
+    def __init__(self, db, log, ttl=60.0, headless=False, fetch_mode='auto'):
+        self.db = db
+        self.logger = log
+        self.ttl = ttl
+        self.headless = headless
+        self.fetch_mode = fetch_mode
+        self._configs = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def reload(self):
+        """
+        Loads every Config row now.
+
+        Returns:
+            bool: True if the configs were replaced.
+        """
+
+        records = self.db.fetch_configs()
+        if records is None:
+            self.logger.warning('Could not reload the Config table, keeping the previous configs')
+            with self._lock:
+                self._loaded_at = time.monotonic()
+            return False
+
+        configs = {}
+        for record in records:
+            try:
+                config = CrawlConfig.from_record(record, self.headless, self.fetch_mode)
+            except (re.error, IndexError, TypeError) as e:
+                self.logger.error(f'Invalid Config row {record[0] if record else record}: {e}')
+                continue
+            configs[config.url_id] = config
+        with self._lock:
+            self._configs = configs
+            self._loaded_at = time.monotonic()
+        self.logger.info(f'Loaded {len(configs)} Config rows')
+        return True
+
+    def _refresh(self):
+        with self._lock:
+            if self._loaded_at is None or self._loaded_at == float('-inf'):
+                stale = True
+            else:
+                stale = time.monotonic() - self._loaded_at >= self.ttl
+                if stale:
+                    # Other threads keep using the current configs while this one reloads
+                    self._loaded_at = time.monotonic()
+        if stale:
+            self.reload()
+
+    def expire(self):
+        """
+        Makes the next lookup reload the configs; safe to call from a signal handler.
+        """
+
+        self._loaded_at = float('-inf')
+
+    def get(self, url_id):
+        """
+        Returns the current `CrawlConfig` of `url_id`, or None if the row does not exist.
+        """
+
+        self._refresh()
+        return self._configs.get(url_id)
+
+    def url_ids(self):
+        self._refresh()
+        return list(self._configs)
@@ -0,0 +1,58 @@
+import threading
+
+from budget import CrawlBudget
+
+
+class CrawlState:
+    """
+    Shared progress of one Config row while it is being crawled.
+
+    Every seed gets its own state object, so threads working on different
+    seeds never contend with each other. Within a seed, only the visited set
+    and the article budget are guarded, each update holding a lock for a
+    single set or integer operation; browser work and sleeps always happen
+    outside of it.
+
+    Args:
+        url_id (int): Identifier for the URL configuration in the database.
+        count (int): Number of articles already stored for this seed.
+        visited (iterable, optional): URLs that should not be queued again.
+        load_stats (PageLoadStats, optional): Page load figures of the seed.
+        recrawl_stats (RecrawlStats, optional): New, updated and skipped article counts of the seed.
+        limit (int, optional): Maximum number of articles stored for this seed.
+    """
+
+    def __init__(self, url_id, count=0, visited=None, load_stats=None, recrawl_stats=None, limit=None):
+        self.url_id = url_id
+        self.budget = CrawlBudget(limit, used=count)
+        self.visited = set(visited or ())
+        self.load_stats = load_stats
+        self.recrawl_stats = recrawl_stats
+        self._lock = threading.Lock()
+
+    @property
+    def count(self):
+        """
+        Number of articles stored for this seed.
+        """
+
+        return self.budget.used
+
+    def filter_unvisited(self, urls):
+        """
+        Marks every new URL in `urls` as visited and returns them in order.
+
+        Args:
+            urls (iterable): Candidate URLs.
+
+        Returns:
+            list: The URLs that had not been visited before.
+        """
+
+        new_urls = []
+        with self._lock:
+            for url in urls:
+                if url not in self.visited:
+                    self.visited.add(url)
+                    new_urls.append(url)
+        return new_urls
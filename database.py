@@ -1,16 +1,50 @@
+import itertools
+import threading
+
 import mysql.connector 
-from mysql.connector import errorcode
+from mysql.connector import errorcode, pooling
+from mysql.connector.constants import ClientFlag
+
+from metrics import Metrics
+from write_behind import BatchWriter
+
+DB_CONFIG = {
+    # database connection details 
+}
+
+INSERT_QUERY = '''
+INSERT INTO bloomberg (url, article_title, article_content, Timestamp)
+VALUES (%s, %s, %s, %s)
+'''
+
+UPDATE_QUERY = '''
+UPDATE bloomberg SET article_title = %s, article_content = %s, Timestamp = %s
+WHERE url = %s
+'''
+
+
+def _url_of(query, row):
+    return row[0] if query is INSERT_QUERY else row[-1]
+
 
 class Database:
 
-    def __init__(self, log):
+    def __init__(self, log, metrics=None):
         self.logger = log
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.pool = None
+        self._lock = threading.Lock()
+        self._writer = None
+        self._writer_conn = None
+        self.rows_written = 0
+        self.rows_failed = 0
 
-    def create_connection(self):
+    def create_connection(self, pool_size=1):
         try:
-            self.conn = mysql.connector.connect(
-                # database connection details 
-            )  
+            # FOUND_ROWS makes the rowcount of an UPDATE the matched rows, also when nothing changed
+            self.pool = pooling.MySQLConnectionPool(pool_name=f'crawler-{id(self)}', pool_size=pool_size,
+                                                    client_flags=[ClientFlag.FOUND_ROWS], **DB_CONFIG)
+            self.conn = self.pool.get_connection()
             self.curr = self.conn.cursor()
             self.logger.info(f'Database is connected successfully ')
 
@@ -22,28 +56,165 @@ class Database:
             else:
                 print(err)
     
+    def start_writer(self, batch_size=100, flush_interval=1.0, max_pending=1000):
+        """
+        Starts the write-behind thread used by `store_db`.
+
+        Rows are put on the bounded queue of a `BatchWriter`, whose thread
+        writes them with `executemany` over its own pooled connection,
+        committing once per batch; consecutive inserts and updates are
+        grouped per query. A batch is written when it holds `batch_size` rows
+        or when its oldest row has waited `flush_interval` seconds. When
+        `max_pending` rows are waiting, `store_db` blocks until the writer
+        catches up. If a batch fails, its rows are written again one by
+        one, so only the rows that fail on their own are lost.
+
+        Args:
+            batch_size (int): Maximum number of rows per commit.
+            flush_interval (float): Maximum seconds a row waits before being written.
+            max_pending (int): Maximum number of rows waiting in the queue.
+        """
+
+        if self._writer is not None:
+            return
+        self._writer_conn = None
+        self._writer = BatchWriter(self.logger, self._write_queued, 'db-writer',
+                                   'Database writer is behind, waiting for a free slot in the write queue',
+                                   batch_size, flush_interval, max_pending, on_stop=self._close_writer_conn)
+        self.logger.info(f'Database writer started with batch size {batch_size}')
+
     def store_db(self, item):
-        insert_query = '''
-        INSERT INTO bloomberg (url, article_title, article_content, Timestamp)
-        VALUES (%s, %s, %s, %s)
-        '''
+        """
+        Stores one article row.
+
+        With a writer running the row is only queued, and True means the row
+        was accepted; insert failures are logged by the writer and counted in
+        `rows_failed`. Without a writer the row is inserted and committed
+        immediately.
+        """
+
+        return self._write(INSERT_QUERY, (item[0], item[1], item[2], item[3]), 'inserted')
+
+    def update_db(self, item):
+        """
+        Replaces the title, content and timestamp of the stored article with the url of `item`.
+
+        Queued like `store_db` when a writer is running, so the update is
+        written after every row queued before it. If no row has the url,
+        as for articles stored before URLs were canonicalized, the article
+        is inserted instead.
+        """
+
+        return self._write(UPDATE_QUERY, (item[1], item[2], item[3], item[0]), 'updated')
+
+    def _write(self, query, row, action):
+        if self._writer is not None:
+            self._writer.put((query, row))
+            return True
+
         try:
-            self.curr.execute(insert_query, (
-                item[0],
-                item[1],
-                item[2],
-                item[3]
-            ))
-            self.conn.commit()
-            print("Data inserted successfully.")
-            self.logger.info('Data insereted successfully into the table')
+            with self._lock, self.metrics.timer('db_insert'):
+                self._execute(self.curr, query, [row])
+                self.conn.commit()
+            print(f"Data {action} successfully.")
+            self.logger.info(f'Data {action} successfully into the table')
+            self.rows_written += 1
             return True
 
         except Exception as e:
-            print('Insert data into table ERROR:', e)
-            self.logger.error(f'Insert data into table ERROR: {e}')
+            print('Write data into table ERROR:', e)
+            self.logger.error(f'Write data into table ERROR: {e}')
+            self.metrics.inc('errors', type=type(e).__name__)
+            self.rows_failed += 1
             return False
 
+    def pending(self):
+        """
+        Returns the number of rows waiting for the writer.
+        """
+
+        return self._writer.pending() if self._writer is not None else 0
+
+    def flush(self):
+        """
+        Blocks until every queued row has been written.
+        """
+
+        if self._writer is not None:
+            self._writer.flush()
+
+    def stop_writer(self):
+        """
+        Writes the remaining rows and stops the writer thread.
+        """
+
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._writer = None
+        self.logger.info(f'Database writer stopped after {self.rows_written} rows ({self.rows_failed} failed)')
+
+    def _write_queued(self, batch):
+        # The writer thread takes its pooled connection on its first batch
+        if self._writer_conn is None:
+            conn = self.pool.get_connection()
+            self._writer_conn = (conn, conn.cursor())
+        self._write_batch(*self._writer_conn, batch)
+
+    def _close_writer_conn(self):
+        if self._writer_conn is not None:
+            conn, cursor = self._writer_conn
+            self._writer_conn = None
+            cursor.close()
+            conn.close()
+
+    def _write_batch(self, conn, cursor, batch):
+        try:
+            with self.metrics.timer('db_insert'):
+                for query, group in itertools.groupby(batch, key=lambda entry: entry[0]):
+                    self._execute(cursor, query, [row for _, row in group])
+                conn.commit()
+            self.rows_written += len(batch)
+            self.logger.info(f'Wrote a batch of {len(batch)} rows into the table')
+        except Exception as e:
+            self.logger.error(f'Write batch of {len(batch)} rows into table ERROR: {e}, writing the rows one by one')
+            self.metrics.inc('errors', type=type(e).__name__)
+            self._rollback(conn)
+            self._write_rows(conn, cursor, batch)
+
+    def _execute(self, cursor, query, rows):
+        if query is not UPDATE_QUERY:
+            cursor.executemany(query, rows)
+            return
+        # Updates run one by one, as only the rowcount of a single UPDATE tells whether its url matched
+        missing = []
+        for row in rows:
+            cursor.execute(query, row)
+            if cursor.rowcount == 0:
+                missing.append((row[3], row[0], row[1], row[2]))
+        if missing:
+            self.logger.info(f'{len(missing)} updated articles were not in the table, inserting them instead')
+            cursor.executemany(INSERT_QUERY, missing)
+
+    def _write_rows(self, conn, cursor, batch):
+        for query, row in batch:
+            try:
+                with self.metrics.timer('db_insert'):
+                    self._execute(cursor, query, [row])
+                    conn.commit()
+                self.rows_written += 1
+            except Exception as e:
+                self.rows_failed += 1
+                self.logger.error(f'Write data of url {_url_of(query, row)} into table ERROR: {e}')
+                self.metrics.inc('errors', type=type(e).__name__)
+                self._rollback(conn)
+
+    def _rollback(self, conn):
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+
     def fetch_url_ids(self):
         try:
            
@@ -60,6 +231,36 @@ class Database:
             print(f"SQL error: {e}")
             return None
     
+    def fetch_configs(self):
+        try:
+
+            # Read every Config row in one query; the lock keeps the shared cursor to one thread
+            with self._lock:
+                self.curr.execute("SELECT * FROM Config")
+                records = self.curr.fetchall()
+                # End the read transaction; under REPEATABLE READ the next reload
+                # would otherwise keep seeing the snapshot of the first one
+                self.conn.commit()
+                return records
+
+        except Exception as e:
+            print(f"SQL error: {e}")
+            self.logger.error(f'Fetch configs ERROR: {e}')
+            return None
+    
+    def fetch_article_urls(self):
+        try:
+
+            # Execute the query to retrieve the url of every stored article
+            self.curr.execute("SELECT url FROM bloomberg")
+
+            # Return the urls as a list
+            return [row[0] for row in self.curr.fetchall()]
+
+        except Exception as e:
+            print(f"SQL error: {e}")
+            return None
+    
     def fetch_record_by_url_id(self, url_id):
         query = '''
         SELECT * FROM Config
@@ -80,6 +281,7 @@ class Database:
 
 
     def close_database(self):
+        self.stop_writer()
         self.curr.close()
         self.conn.close()
         self.logger.info('Database connection closed')
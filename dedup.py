@@ -0,0 +1,230 @@
+import glob
+import hashlib
+import operator
+import os
+import re
+import struct
+import threading
+from array import array
+
+_WORD = re.compile(r'\w+')
+
+# Words per shingle and values per MinHash signature
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+
+_NO_VALUE = 1 << 64
+
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def minhash(text, shingle_size=SHINGLE_SIZE, num_perm=NUM_PERM, min_shingles=None):
+    """
+    Returns the MinHash signature of the word shingles of `text`.
+
+    Uses one-permutation hashing: every shingle is hashed once and the hash
+    picks one of `num_perm` bins, each keeping its smallest value, so the
+    cost is linear in the length of the text. Bins no shingle fell into
+    borrow the value of the next filled bin. Only the lowest 8 bits of every
+    value are kept (b-bit MinHash), one byte per value. A text with fewer
+    than `min_shingles` shingles gets no signature: most of its bins would
+    be borrowed, and unrelated short texts would look alike.
+
+    Args:
+        text (str): Normalized article text.
+        shingle_size (int): Number of consecutive words per shingle.
+        num_perm (int): Number of values in the signature.
+        min_shingles (int, optional): Fewest shingles signed, `num_perm // 4` by default.
+
+    Returns:
+        bytes: The `num_perm` byte signature, or None for a text with too few shingles.
+    """
+
+    words = _WORD.findall(text.lower())
+    if not words:
+        return None
+    size = min(shingle_size, len(words))
+    shingles = {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    if len(shingles) < (num_perm // 4 if min_shingles is None else min_shingles):
+        return None
+
+    mins = [_NO_VALUE] * num_perm
+    for shingle in shingles:
+        value = _hash64(shingle)
+        slot = value % num_perm
+        value //= num_perm
+        if value < mins[slot]:
+            mins[slot] = value
+
+    signature = bytearray(num_perm)
+    for slot in range(num_perm):
+        offset = 0
+        while mins[(slot + offset) % num_perm] == _NO_VALUE:
+            offset += 1
+        # Mix in the distance so borrowed values differ from the bin they came from
+        signature[slot] = (mins[(slot + offset) % num_perm] + offset * 0x9E37) & 0xFF
+    return bytes(signature)
+
+
+class MinHashIndex:
+    """
+    Signatures of stored articles, answering "is one at least `threshold` similar?".
+
+    Signatures live back to back in one `bytearray`, `num_perm` bytes per
+    article. For lookups every signature is cut into `bands` bands whose
+    hashes, reduced to 16 bits, index `array('I')` buckets of positions, so
+    the tables take 4 bytes per article and band. Two articles with a
+    Jaccard similarity of 0.8 share at least one band with a probability
+    above 99.9% at the default 16 bands of 4 values; the candidates are then
+    compared value by value. Only the signatures are saved, the band tables
+    are rebuilt on load. Safe to share between crawl threads.
+
+    Args:
+        threshold (float): Estimated Jaccard similarity from which an article is a duplicate.
+        num_perm (int): Values per signature.
+        bands (int): Number of bands; must divide `num_perm`.
+    """
+
+    _MAGIC = b'MHIX'
+    _HEADER = struct.Struct('<4sII')
+
+    def __init__(self, threshold=0.8, num_perm=NUM_PERM, bands=16):
+        if num_perm % bands:
+            raise ValueError(f'{bands} bands do not divide {num_perm} values')
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.rows = num_perm // bands
+        self._signatures = bytearray()
+        self._bands = [{} for _ in range(bands)]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._signatures) // self.num_perm
+
+    def similarity(self, first, second):
+        """
+        Returns the Jaccard similarity estimated from two signatures.
+        """
+
+        matches = sum(map(operator.eq, first, second)) / self.num_perm
+        # Unrelated 8-bit values are still equal one time in 256
+        return max(0.0, (matches - 1 / 256) / (1 - 1 / 256))
+
+    def _band_keys(self, signature):
+        return [hash(signature[start:start + self.rows]) & 0xFFFF for start in range(0, self.num_perm, self.rows)]
+
+    def _find(self, signature, keys):
+        checked = set()
+        for band, key in zip(self._bands, keys):
+            for position in band.get(key, ()):
+                if position in checked:
+                    continue
+                checked.add(position)
+                start = position * self.num_perm
+                score = self.similarity(signature, self._signatures[start:start + self.num_perm])
+                if score >= self.threshold:
+                    return score
+        return None
+
+    def _add(self, signature, keys):
+        position = len(self)
+        self._signatures += signature
+        for band, key in zip(self._bands, keys):
+            bucket = band.get(key)
+            if bucket is None:
+                bucket = band[key] = array('I')
+            bucket.append(position)
+
+    def find(self, signature):
+        """
+        Returns the estimated similarity of a stored near duplicate of `signature`, or None.
+        """
+
+        signature = bytes(signature)
+        keys = self._band_keys(signature)
+        with self._lock:
+            return self._find(signature, keys)
+
+    def add(self, signature):
+        """
+        Stores `signature` unless a near duplicate is already stored.
+
+        Returns:
+            float: Estimated similarity of the near duplicate already stored,
+            or None if `signature` was added.
+        """
+
+        signature = bytes(signature)
+        keys = self._band_keys(signature)
+        with self._lock:
+            score = self._find(signature, keys)
+            if score is None:
+                self._add(signature, keys)
+            return score
+
+    def merge(self, other):
+        for position in range(len(other)):
+            self.add(bytes(other._signatures[position * other.num_perm:(position + 1) * other.num_perm]))
+
+    def save(self, path):
+        with self._lock:
+            signatures = bytes(self._signatures)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self._HEADER.pack(self._MAGIC, self.num_perm, len(signatures) // self.num_perm))
+            f.write(signatures)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, threshold=0.8, bands=16):
+        """
+        Reads an index saved with `save`.
+
+        Raises:
+            ValueError: If the file is not a complete MinHash index.
+        """
+
+        with open(path, 'rb') as f:
+            header = f.read(cls._HEADER.size)
+            if len(header) != cls._HEADER.size or header[:4] != cls._MAGIC:
+                raise ValueError(f'Not a MinHash index file: {path}')
+            _, num_perm, count = cls._HEADER.unpack(header)
+            signatures = f.read()
+        if len(signatures) != num_perm * count:
+            raise ValueError(f'Corrupt MinHash index file {path}')
+
+        index = cls(threshold, num_perm, bands)
+        for position in range(count):
+            signature = signatures[position * num_perm:(position + 1) * num_perm]
+            index._add(signature, index._band_keys(signature))
+        return index
+
+
+def load_index(path, threshold=0.8, log=None):
+    """
+    Loads the index saved at `path` together with the `path.shard*` files of sharded workers.
+
+    Missing or unreadable files are skipped, so the first run starts empty.
+    """
+
+    index = None
+    for file_path in [path] + sorted(glob.glob(f'{glob.escape(path)}.shard*')):
+        if not os.path.exists(file_path):
+            continue
+        try:
+            loaded = MinHashIndex.load(file_path, threshold)
+        except (OSError, ValueError) as e:
+            if log:
+                log.warning(f'Could not load the near-duplicate index {file_path}: {e}')
+            continue
+        if index is None:
+            index = loaded
+        else:
+            index.merge(loaded)
+    if index is None:
+        index = MinHashIndex(threshold)
+    if log:
+        log.info(f'Near-duplicate index holds {len(index)} articles')
+    return index
@@ -0,0 +1,83 @@
+from content import MAX_ARTICLE_CHARS, normalize_text
+
+# Collects the child url hrefs, the article title and the article content of a
+# page in a single page.evaluate call. Selectors are evaluated as XPath when they
+# start with `xpath=`, `/`, `(` or `..`, and as CSS otherwise, like Playwright does.
+# At most maxChars characters of content text leave the page.
+EXTRACT_PAGE_SCRIPT = '''
+([childSelector, titleSelector, contentSelector, maxChars]) => {
+    const select = (selector) => {
+        if (!selector) {
+            return [];
+        }
+        if (selector.startsWith('xpath=') || /^(\\/|\\(|\\.\\.)/.test(selector)) {
+            const expression = selector.startsWith('xpath=') ? selector.slice(6) : selector;
+            const result = document.evaluate(expression, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+            const nodes = [];
+            for (let i = 0; i < result.snapshotLength; i++) {
+                nodes.push(result.snapshotItem(i));
+            }
+            return nodes;
+        }
+        return Array.from(document.querySelectorAll(selector.startsWith('css=') ? selector.slice(4) : selector));
+    };
+
+    const hrefs = select(childSelector).map(node => node.getAttribute ? node.getAttribute('href') : node.nodeValue);
+    const titleNode = select(titleSelector)[0];
+    const contents = [];
+    let remaining = maxChars;
+    for (const node of select(contentSelector)) {
+        if (remaining <= 0) {
+            break;
+        }
+        const text = node.textContent;
+        contents.push(text.length > remaining ? text.slice(0, remaining) : text);
+        remaining -= text.length;
+    }
+    return {
+        hrefs: hrefs,
+        title: titleNode ? titleNode.textContent : null,
+        contents: contents,
+    };
+}
+'''
+
+
+def _page_fields(result, max_chars):
+    return {
+        'hrefs': result['hrefs'],
+        'title': normalize_text([result['title']], max_chars) if result['title'] is not None else None,
+        'content': normalize_text(result['contents'], max_chars),
+    }
+
+
+def extract_page(page, child_url_xpath=None, article_title_xpth=None, article_content_xpth=None,
+                 max_chars=MAX_ARTICLE_CHARS):
+    """
+    Extracts child url hrefs and article fields from a loaded page in one round trip.
+
+    Args:
+        page (playwright.sync_api.Page): Loaded page.
+        child_url_xpath (str, optional): Selector of the child url anchors.
+        article_title_xpth (str, optional): Selector of the article title.
+        article_content_xpth (str, optional): Selector of the article content.
+        max_chars (int): Maximum length of the normalized content.
+
+    Returns:
+        dict: `hrefs` (list), `title` (str or None) and `content` (str),
+        with whitespace collapsed as by `content.normalize_text`.
+    """
+
+    # Whitespace collapses later, so twice the cap is taken from the page
+    result = page.evaluate(EXTRACT_PAGE_SCRIPT, [child_url_xpath, article_title_xpth, article_content_xpth, 2 * max_chars])
+    return _page_fields(result, max_chars)
+
+
+async def extract_page_async(page, child_url_xpath=None, article_title_xpth=None, article_content_xpth=None,
+                             max_chars=MAX_ARTICLE_CHARS):
+    """
+    Same as `extract_page` for a `playwright.async_api` page.
+    """
+
+    result = await page.evaluate(EXTRACT_PAGE_SCRIPT, [child_url_xpath, article_title_xpth, article_content_xpth, 2 * max_chars])
+    return _page_fields(result, max_chars)
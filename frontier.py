@@ -0,0 +1,162 @@
+import heapq
+import itertools
+import json
+import os
+import tempfile
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+
+class _SpillRun:
+    """
+    Sorted run of frontier entries written to disk, read back one line at a time.
+    """
+
+    def __init__(self, path, entries):
+        self.path = path
+        self.size = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + '\n')
+                self.size += 1
+        self._file = open(path, 'r', encoding='utf-8')
+        self.head = None
+        self.advance()
+
+    def drain(self):
+        """
+        Yields the remaining entries in order, the head first.
+        """
+
+        while self.head is not None:
+            yield self.head
+            self.advance()
+
+    def advance(self):
+        line = self._file.readline()
+        self.head = tuple(json.loads(line)) if line else None
+        if self.head is not None:
+            self.size -= 1
+
+    def close(self):
+        self._file.close()
+        os.remove(self.path)
+
+
+class Frontier:
+    """
+    Priority queue of URLs waiting to be crawled for one seed.
+
+    URLs are ordered by depth first, then by how many URLs of the same host
+    were queued before them, then by discovery order. Shallow pages are
+    therefore crawled before deep ones, and the hosts sharing a depth take
+    turns. URLs deeper than `max_depth` are dropped on push.
+
+    At most `max_in_memory` entries are held in memory. When the heap grows
+    past that, its worse half is sorted and spilled to a run file, and `pop`
+    merges the heap with the head of every run, so the order stays exact.
+    Once there are more than `max_runs` runs, the smaller half of them is
+    merged into one, which bounds the open files and the work of a `pop`.
+
+    Args:
+        max_depth (int, optional): Deepest level that is queued; None means no limit.
+        max_in_memory (int): Number of entries kept in memory before spilling.
+        max_runs (int): Number of run files kept before some are merged.
+        spill_dir (str, optional): Directory for run files. A temporary
+            directory is used by default.
+    """
+
+    def __init__(self, max_depth=None, max_in_memory=10000, spill_dir=None, max_runs=16):
+        self.max_depth = max_depth
+        self.max_in_memory = max_in_memory
+        self.max_runs = max_runs
+        self._spill_dir = spill_dir
+        self._owns_spill_dir = False
+        self._heap = []
+        self._runs = []
+        self._host_counts = defaultdict(int)
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._heap) + sum(run.size + (run.head is not None) for run in self._runs)
+
+    def push(self, url, depth):
+        """
+        Queues `url` at `depth`.
+
+        Returns:
+            bool: False if the URL is deeper than `max_depth` and was dropped.
+        """
+
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+        host = urlsplit(url).netloc.lower()
+        self._host_counts[host] += 1
+        heapq.heappush(self._heap, (depth, self._host_counts[host], next(self._seq), url))
+        if len(self._heap) > self.max_in_memory:
+            self._spill()
+        return True
+
+    def pop(self):
+        """
+        Removes and returns the highest priority entry.
+
+        Returns:
+            tuple: `(url, depth)`, or None if the frontier is empty.
+        """
+
+        best_run = None
+        best = self._heap[0] if self._heap else None
+        for run in self._runs:
+            if run.head is not None and (best is None or run.head < best):
+                best, best_run = run.head, run
+
+        if best is None:
+            return None
+        if best_run is None:
+            heapq.heappop(self._heap)
+        else:
+            best_run.advance()
+            if best_run.head is None:
+                best_run.close()
+                self._runs.remove(best_run)
+        return best[3], best[0]
+
+    def close(self):
+        """
+        Deletes the spill files of the frontier.
+        """
+
+        for run in self._runs:
+            run.close()
+        self._runs = []
+        self._heap = []
+        if self._owns_spill_dir:
+            os.rmdir(self._spill_dir)
+            self._owns_spill_dir = False
+            self._spill_dir = None
+
+    def _spill(self):
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix='frontier-')
+            self._owns_spill_dir = True
+
+        entries = sorted(self._heap)
+        keep = len(entries) // 2
+        self._heap = entries[:keep]
+        heapq.heapify(self._heap)
+        self._runs.append(_SpillRun(self._run_path(), entries[keep:]))
+        if len(self._runs) > self.max_runs:
+            self._merge_runs()
+
+    def _run_path(self):
+        return os.path.join(self._spill_dir, f'run-{next(self._seq)}.jsonl')
+
+    def _merge_runs(self):
+        # Merging the smaller half keeps runs of similar sizes, so each entry is rewritten only a few times
+        self._runs.sort(key=lambda run: run.size)
+        count = max(2, len(self._runs) // 2)
+        merged, self._runs = self._runs[:count], self._runs[count:]
+        self._runs.append(_SpillRun(self._run_path(), heapq.merge(*(run.drain() for run in merged))))
+        for run in merged:
+            run.close()
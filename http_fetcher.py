@@ -0,0 +1,220 @@
+import time
+from functools import lru_cache
+
+import requests
+from lxml import html
+from lxml.etree import XPath, XPathError, XPathSyntaxError
+from requests.adapters import HTTPAdapter
+
+from concurrency import OK, THROTTLED, TIMEOUT
+from content import MAX_ARTICLE_CHARS, normalize_text
+from metrics import Metrics
+from retry import DNS, NETWORK, THROTTLED as THROTTLED_FAILURE, TIMEOUT as TIMEOUT_FAILURE, FetchFailed
+
+FETCH_MODES = ('browser', 'http', 'auto')
+
+# Returned by `HttpFetcher.extract_page` when a conditional request got a 304
+NOT_MODIFIED = object()
+
+# Statuses telling the crawler to slow down
+THROTTLE_STATUSES = (429, 503)
+
+# Messages of connection errors caused by hosts that do not resolve
+_DNS_MARKERS = ('NameResolutionError', 'Failed to resolve', 'Name or service not known', 'nodename nor servname',
+                'getaddrinfo failed')
+
+DEFAULT_USER_AGENT = (
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/124.0 Safari/537.36'
+)
+
+
+def to_lxml_xpath(selector):
+    """
+    Converts a Playwright XPath selector to a plain XPath expression.
+
+    Playwright accepts `xpath=//a` as well as bare expressions starting with
+    `//` or `..`. Anything else, such as a CSS selector, cannot be evaluated
+    by lxml and yields None.
+    """
+
+    selector = selector.strip()
+    if selector.startswith('xpath='):
+        return selector[len('xpath='):]
+    if selector.startswith(('/', '(', '..')):
+        return selector
+    return None
+
+
+@lru_cache(maxsize=256)
+def compile_xpath(selector):
+    """
+    Returns the compiled lxml XPath of a Playwright selector.
+
+    Config rows share a handful of selectors, so each one is compiled once
+    per process. Selectors that are not XPath or do not compile yield None.
+    """
+
+    expression = to_lxml_xpath(selector)
+    if expression is None:
+        return None
+    try:
+        return XPath(expression)
+    except XPathSyntaxError:
+        return None
+
+
+def failure_kind(error):
+    """
+    Returns the retry failure kind of a failed request, or None if retrying cannot help.
+
+    Timeouts are `TIMEOUT`, unresolvable hosts `DNS`, 429 and 503 answers
+    `THROTTLED`, and other connection errors and 5xx answers `NETWORK`.
+    Other HTTP errors, such as a 404, and malformed requests have no kind.
+    """
+
+    if getattr(error.response, 'status_code', None) in THROTTLE_STATUSES:
+        return THROTTLED_FAILURE
+    if isinstance(error, requests.Timeout):
+        return TIMEOUT_FAILURE
+    if isinstance(error, requests.ConnectionError):
+        return DNS if any(marker in str(error) for marker in _DNS_MARKERS) else NETWORK
+    status = getattr(error.response, 'status_code', None)
+    if status is not None and status >= 500:
+        return NETWORK
+    return None
+
+
+def _node_text(node):
+    return node if isinstance(node, str) else node.text_content()
+
+
+class HttpFetcher:
+    """
+    Fetches pages over plain HTTP and evaluates the Config XPaths with lxml.
+
+    A single `requests.Session` is shared by every crawl thread; its adapter
+    keeps up to `pool_size` keep-alive connections per host, so consecutive
+    articles of a site reuse the same TCP and TLS connection. Extraction
+    methods return None when the page could not be fetched or a selector is
+    not XPath, letting the caller fall back to the browser.
+
+    Given the ETag or Last-Modified value of an earlier fetch, requests are
+    sent as conditional requests, and an unchanged page is answered with a
+    bodyless 304 that is reported as `NOT_MODIFIED`.
+
+    Args:
+        log (logging.Logger): Logger used for fetch messages.
+        pool_size (int): Number of pooled connections kept per host.
+        timeout (float): Connect and read timeout in seconds.
+        user_agent (str): User agent sent with every request.
+        metrics (Metrics, optional): Receives `http_fetch` and `extraction`
+            timings and failed requests by error type.
+        controller (ConcurrencyController, optional): Told about every
+            response time, timeout and 429 or 503 answer.
+        max_chars (int): Maximum length of the normalized article content.
+    """
+
+    def __init__(self, log, pool_size=10, timeout=30, user_agent=DEFAULT_USER_AGENT, metrics=None, controller=None,
+                 max_chars=MAX_ARTICLE_CHARS):
+        self.logger = log
+        self.max_chars = max_chars
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.controller = controller
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = user_agent
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _get(self, url, etag=None, last_modified=None, timeout=None, raise_failures=False):
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        try:
+            start = time.perf_counter()
+            with self.metrics.timer('http_fetch'):
+                response = self.session.get(url, headers=headers, timeout=timeout or self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            self.logger.error(f'HTTP fetch failed for url {url}: {e}')
+            self.metrics.inc('errors', type=type(e).__name__)
+            self._record(url, e)
+            kind = failure_kind(e)
+            # A throttled host must not be asked again at once, whatever the mode
+            if kind == THROTTLED_FAILURE or (raise_failures and kind):
+                raise FetchFailed(url, kind, str(e)) from e
+            return None
+        self._record(url, None, time.perf_counter() - start)
+        return response
+
+    def _record(self, url, error, seconds=None):
+        if self.controller is None:
+            return
+        if error is None:
+            self.controller.record(url, OK, seconds)
+        elif isinstance(error, requests.Timeout):
+            self.controller.record(url, TIMEOUT)
+        elif getattr(error.response, 'status_code', None) in THROTTLE_STATUSES:
+            self.controller.record(url, THROTTLED)
+
+    def extract_page(self, url, child_url_xpath=None, article_title_xpth=None, article_content_xpth=None,
+                     etag=None, last_modified=None, timeout=None, raise_failures=False):
+        """
+        Extracts child url hrefs and article fields of `url` from the server HTML.
+
+        Selectors passed as None are skipped. With `etag` or `last_modified`
+        the request is conditional. `timeout` overrides the fetcher's timeout
+        in seconds. A 429 or 503 answer always raises, so the host is given
+        time before the URL is tried again. With `raise_failures`, any other
+        failed request that may succeed later raises as well instead of
+        returning None.
+
+        Returns:
+            dict: `hrefs` (list), `title` (str or None) and `content` (str),
+            in the same shape and normalized like `extraction.extract_page`, plus the `etag`
+            and `last_modified` response headers. `NOT_MODIFIED` if the
+            server answered 304, and None if the page could not be fetched
+            or a selector is not XPath.
+
+        Raises:
+            FetchFailed: On a 429 or 503 answer and, with `raise_failures`,
+                on a timeout, a connection error or another 5xx answer.
+        """
+
+        selectors = [child_url_xpath, article_title_xpth, article_content_xpth]
+        xpaths = [compile_xpath(selector) if selector else None for selector in selectors]
+        if any(selector and xpath is None for selector, xpath in zip(selectors, xpaths)):
+            return None
+        child_xpath, title_xpath, content_xpath = xpaths
+
+        response = self._get(url, etag, last_modified, timeout, raise_failures)
+        if response is None:
+            return None
+        if response.status_code == 304:
+            return NOT_MODIFIED
+        if not response.content:
+            return None
+        try:
+            with self.metrics.timer('extraction'):
+                document = html.fromstring(response.content, base_url=response.url)
+                anchors = child_xpath(document) if child_xpath else []
+                title_nodes = title_xpath(document) if title_xpath else []
+                content_nodes = content_xpath(document) if content_xpath else []
+        except XPathError as e:
+            self.logger.warning(f'Cannot evaluate the config xpaths with lxml for url {url}: {e}')
+            return None
+
+        return {
+            'hrefs': [node if isinstance(node, str) else node.get('href') for node in anchors],
+            'title': normalize_text([_node_text(title_nodes[0])], self.max_chars) if title_nodes else None,
+            'content': normalize_text((_node_text(node) for node in content_nodes), self.max_chars),
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+
+    def close(self):
+        self.session.close()
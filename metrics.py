@@ -0,0 +1,243 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in sorted(labels.items())) + '}'
+
+
+class _StageTimes:
+    """
+    Count, total and maximum duration of one crawl stage.
+    """
+
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+
+class Metrics:
+    """
+    Thread-safe registry of crawl stage timings, counters and gauges.
+
+    Stage timings are recorded with `timer` or `observe`, counters with
+    `inc`, optionally with labels such as the error type. Gauges are
+    callables read when the metrics are rendered, so queue depths and active
+    pages cost nothing on the hot path. `render_prometheus` and `snapshot`
+    expose the same figures as Prometheus text and as a dict.
+
+    Args:
+        keep_samples (bool): Whether every stage duration is kept for
+            `percentile`, which benchmarks need and long crawls should avoid.
+    """
+
+    def __init__(self, keep_samples=False):
+        self.keep_samples = keep_samples
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Clears every timing and counter and restarts the uptime; gauges are kept.
+        """
+
+        with self._lock:
+            self.started = time.monotonic()
+            self._stages = defaultdict(_StageTimes)
+            self._samples = defaultdict(list)
+            self._counters = defaultdict(int)
+
+    @contextmanager
+    def timer(self, stage):
+        """
+        Times the body of a `with` block as one occurrence of `stage`, even if it raises.
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self._stages[stage].add(seconds)
+            if self.keep_samples:
+                self._samples[stage].append(seconds)
+
+    def percentile(self, stage, q):
+        """
+        Returns the `q` quantile (0 to 1) of the kept durations of `stage`, or None without samples.
+        """
+
+        with self._lock:
+            samples = sorted(self._samples.get(stage, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def counter(self, name):
+        """
+        Returns the total of counter `name` over every label set.
+        """
+
+        with self._lock:
+            return sum(value for (counter_name, _), value in self._counters.items() if counter_name == name)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += amount
+
+    def gauge(self, name, fn):
+        """
+        Registers `fn`, returning a number, as the current value of gauge `name`.
+        """
+
+        with self._lock:
+            self._gauges[name] = fn
+
+    def _read_gauges(self):
+        with self._lock:
+            gauges = dict(self._gauges)
+        values = {}
+        for name, fn in gauges.items():
+            try:
+                values[name] = fn()
+            except Exception:
+                continue
+        return values
+
+    def snapshot(self):
+        """
+        Returns every metric as a JSON serializable dict.
+        """
+
+        gauges = self._read_gauges()
+        pages = self.counter('pages')
+        with self._lock:
+            uptime = time.monotonic() - self.started
+            return {
+                'uptime_seconds': uptime,
+                'pages_per_second': pages / uptime if uptime else 0.0,
+                'stages': {
+                    stage: {'count': times.count, 'total_seconds': times.total, 'max_seconds': times.max,
+                            'average_seconds': times.total / times.count if times.count else 0.0}
+                    for stage, times in self._stages.items()
+                },
+                'counters': [
+                    {'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in self._counters.items()
+                ],
+                'gauges': gauges,
+            }
+
+    def render_prometheus(self):
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+
+        snapshot = self.snapshot()
+        lines = [
+            '# TYPE crawler_uptime_seconds gauge',
+            f'crawler_uptime_seconds {snapshot["uptime_seconds"]:.3f}',
+            '# TYPE crawler_pages_per_second gauge',
+            f'crawler_pages_per_second {snapshot["pages_per_second"]:.3f}',
+            '# TYPE crawler_stage_seconds summary',
+        ]
+        for stage, times in sorted(snapshot['stages'].items()):
+            lines.append(f'crawler_stage_seconds_count{{stage="{stage}"}} {times["count"]}')
+            lines.append(f'crawler_stage_seconds_sum{{stage="{stage}"}} {times["total_seconds"]:.6f}')
+            lines.append(f'crawler_stage_seconds_max{{stage="{stage}"}} {times["max_seconds"]:.6f}')
+        for name in sorted({counter['name'] for counter in snapshot['counters']}):
+            lines.append(f'# TYPE crawler_{name}_total counter')
+            for counter in snapshot['counters']:
+                if counter['name'] == name:
+                    lines.append(f'crawler_{name}_total{_labels(counter["labels"])} {counter["value"]}')
+        for name, value in sorted(snapshot['gauges'].items()):
+            lines.append(f'# TYPE crawler_{name} gauge')
+            lines.append(f'crawler_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """
+    Serves `Metrics.render_prometheus` at `/metrics` from a daemon thread.
+
+    Args:
+        metrics (Metrics): Registry to expose.
+        port (int): Port to listen on.
+        host (str): Interface to bind, local only by default.
+    """
+
+    def __init__(self, metrics, port, host='127.0.0.1'):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self.server.serve_forever, name='metrics-server', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class MetricsDumper:
+    """
+    Writes `Metrics.snapshot` as JSON to `path` every `interval` seconds.
+
+    The file is replaced atomically, so readers never see a partial dump.
+    A last dump is written on `close`.
+    """
+
+    def __init__(self, metrics, path, interval=10.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='metrics-dumper', daemon=True)
+        self._thread.start()
+
+    def dump(self):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.metrics.snapshot(), f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.dump()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.dump()
@@ -1,14 +1,38 @@
-from urllib.parse import urljoin
-import time
-import random
+from urllib.parse import urljoin, urlsplit
+import argparse
+import asyncio
+import itertools
 import logging
-from playwright.sync_api import sync_playwright, TimeoutError, Error as PageError
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from datetime import datetime
-import re
-import threading
-
+import multiprocessing
+import queue
+import signal
+import time
+from logging.handlers import QueueHandler, QueueListener
+from playwright.sync_api import TimeoutError, Error as PageError
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timedelta, timezone
+
+from async_engine import AsyncCrawler
+from browser_pool import BLOCKED_DOMAINS, BLOCKED_RESOURCE_TYPES, BrowserPool, PageLoadStats
+from checkpoint import CheckpointStore
+from concurrency import ERROR, OK, THROTTLED, TIMEOUT, ConcurrencyController, page_capacity
+from crawl_config import ConfigStore
+from crawl_state import CrawlState
 from database import Database
+from dedup import load_index, minhash
+from extraction import extract_page
+from frontier import Frontier
+from http_fetcher import NOT_MODIFIED, THROTTLE_STATUSES, HttpFetcher
+from metrics import Metrics, MetricsDumper, MetricsServer
+from recrawl import RecrawlStats, ValidatorStore, content_hash
+from retry import TIMEOUT as TIMEOUT_FAILURE, DeadLetterLog, FetchFailed, RetryQueue, classify_page_error, escalated_timeout
+from robots import RobotsCache
+from scheduler import HostScheduler
+from seen_store import SeenStore
+from sharding import SharedCrawlState, SQLiteBackend, shard_for
+from sinks import EXPORT_FORMATS, ArticlePipeline, build_sinks
+from sitemap import SitemapIngester
+from url_utils import canonicalize_url
 
 # Configure logging
 logging.basicConfig(
@@ -21,445 +45,1149 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)     
 
+# Stage timings, counters and gauges of the crawl. Served as Prometheus text on
+# METRICS_PORT and/or dumped as JSON to METRICS_JSON_PATH every METRICS_INTERVAL seconds.
+metrics = Metrics()
+METRICS_PORT = None
+METRICS_JSON_PATH = None
+METRICS_INTERVAL = 10.0
+
+# Per-URL progress is printed unless the queue-based logger is enabled
+PRINT_PROGRESS = True
+
+# Database write settings. Articles are queued and inserted in batches by a writer thread.
+DB_POOL_SIZE = 2
+DB_BATCH_SIZE = 100
+DB_FLUSH_INTERVAL = 2.0
+
 # Initialize database connection
-db_instance = Database(logger)
-db_instance.create_connection()
-url_ids = db_instance.fetch_url_ids()
+db_instance = Database(logger, metrics=metrics)
+db_instance.create_connection(pool_size=DB_POOL_SIZE)
+db_instance.start_writer(batch_size=DB_BATCH_SIZE, flush_interval=DB_FLUSH_INTERVAL)
+
+# Destinations of stored articles: the bloomberg table unless EXPORT_TO_DB is off
+# and, with EXPORT_DIR set, rotated compressed JSONL or Parquet files there. A
+# pipeline thread fans every batch of EXPORT_BATCH_SIZE articles out to all of them.
+EXPORT_TO_DB = True
+EXPORT_DIR = None
+EXPORT_FORMAT = 'jsonl'
+EXPORT_MAX_ROWS = 100_000
+EXPORT_BATCH_SIZE = 500
+article_pipeline = ArticlePipeline(logger, build_sinks(logger, db_instance, EXPORT_DIR, EXPORT_FORMAT, EXPORT_MAX_ROWS),
+                                   metrics=metrics, batch_size=EXPORT_BATCH_SIZE)
+
+# Canonical URLs of every stored article, kept across runs. Filled from the
+# bloomberg table in one query the first time the store is created.
+SEEN_STORE_PATH = 'seen_urls.sqlite3'
+SEEN_STORE_CAPACITY = 1_000_000
+seen_store = SeenStore(SEEN_STORE_PATH, capacity=SEEN_STORE_CAPACITY, log=logger)
+if len(seen_store) == 0:
+    stored_urls = db_instance.fetch_article_urls() or []
+    logger.info(f'Loaded {seen_store.add_many(canonicalize_url(url) for url in stored_urls)} stored article urls into the seen store')
+
+# ETag, Last-Modified and content hash of every stored article. With
+# INCREMENTAL set, stored articles are fetched again with conditional requests,
+# unchanged ones are skipped and changed ones are updated in place.
+VALIDATOR_STORE_PATH = 'page_validators.sqlite3'
+validator_store = ValidatorStore(VALIDATOR_STORE_PATH)
+INCREMENTAL = False
+
+# Crawl progress for each URL ID, registered by main when a seed starts
+crawl_states = {}
+
+# Browser pool settings. HEADLESS is used when a Config row has no headless column.
+# The pool renders as many pages at once as the CPUs and the memory available for
+# PAGE_MEMORY bytes per page allow.
+PAGE_MEMORY = 300 * 1024 * 1024
+BROWSER_POOL_SIZE = page_capacity(PAGE_MEMORY)
+PAGES_PER_BROWSER = 50
+HEADLESS = False
+
+# Requests aborted by every browser context, and the load state awaited after
+# navigation: 'commit', 'domcontentloaded', or 'selector' to wait only until the
+# article content (or the child url anchors) is attached.
+BLOCK_RESOURCE_TYPES = BLOCKED_RESOURCE_TYPES
+BLOCK_DOMAINS = BLOCKED_DOMAINS
+BLOCK_THIRD_PARTY_SCRIPTS = False
+WAIT_UNTIL = 'domcontentloaded'
+
+# Long-lived browsers shared by every seed and every worker thread
+browser_pool = BrowserPool(logger, size=BROWSER_POOL_SIZE, headless=HEADLESS, pages_per_browser=PAGES_PER_BROWSER,
+                           block_resource_types=BLOCK_RESOURCE_TYPES, block_domains=BLOCK_DOMAINS,
+                           block_third_party_scripts=BLOCK_THIRD_PARTY_SCRIPTS, metrics=metrics)
+
+# Per-host concurrency starts at the Config max_threads and is adapted AIMD style
+# from there: raised while latency stays healthy, halved on timeouts, browser errors
+# and HTTP 429/503, up to the optional Config max_concurrency of the host. SCHEDULER_WORKERS, the global cap, leaves room for plain HTTP fetches
+# next to the pages rendering in the browser pool.
+SCHEDULER_WORKERS = 2 * BROWSER_POOL_SIZE
+concurrency = ConcurrencyController(logger, max_limit=SCHEDULER_WORKERS, metrics=metrics)
+
+# robots.txt of every host, fetched again once it is ROBOTS_TTL seconds old. Its
+# Crawl-delay spaces the scheduler's requests and its Sitemap lines lead to the sitemaps.
+ROBOTS_TTL = 6 * 3600.0
+robots_cache = RobotsCache(logger, ttl=ROBOTS_TTL, metrics=metrics)
+
+# Worker threads pulling the next eligible URL from any host
+scheduler = HostScheduler(logger, workers=SCHEDULER_WORKERS, metrics=metrics, controller=concurrency, robots=robots_cache)
+
+# Fetch mode used when a Config row has no fetch_mode column. 'auto' tries plain
+# HTTP first and falls back to the browser when extraction comes back empty.
+FETCH_MODE = 'auto'
+HTTP_POOL_SIZE = 10
+http_fetcher = HttpFetcher(logger, pool_size=HTTP_POOL_SIZE, metrics=metrics, controller=concurrency)
+
+# Every Config row, loaded in one query and reloaded once it is CONFIG_TTL seconds
+# old, so edits to the table reach running crawls. SIGHUP forces a reload.
+CONFIG_TTL = 60.0
+config_store = ConfigStore(db_instance, logger, ttl=CONFIG_TTL, headless=HEADLESS, fetch_mode=FETCH_MODE)
+config_store.reload()
+url_ids = config_store.url_ids()
 print(url_ids)
 
-# Initialize counters for each URL ID
-counters = {url_id: 0 for url_id in url_ids}
+# With SITEMAPS on, a seed's articles are found in the sitemaps of its Config
+# sitemap_url column, or else of its robots.txt, instead of by rendering the seed
+# page. Entries matching the child url pattern and changed within SITEMAP_MAX_AGE
+# seconds are queued as depth 1 URLs; a seed whose sitemaps yield none is crawled
+# from its seed page as before.
+SITEMAPS = False
+SITEMAP_MAX_AGE = 2 * 86400
+SITEMAP_BATCH_SIZE = 1000
+sitemap_ingester = SitemapIngester(logger, robots=robots_cache, metrics=metrics)
+
+# Frontier settings. MAX_DEPTH of None crawls until the maximum URL limit is reached.
+MAX_DEPTH = None
+FRONTIER_MEMORY_LIMIT = 10000
+
+# Frontiers of the seeds being crawled, by URL ID
+active_frontiers = {}
+
+metrics.gauge('frontier_size', lambda: sum(len(frontier) for frontier in list(active_frontiers.values())))
+metrics.gauge('scheduler_queue_depth', scheduler.pending)
+metrics.gauge('db_write_queue_depth', db_instance.pending)
+metrics.gauge('export_queue_depth', lambda: article_pipeline.pending())
+metrics.gauge('active_pages', lambda: browser_pool.active)
+metrics.gauge('browsers', lambda: browser_pool.browsers)
+metrics.gauge('host_concurrency_limit', concurrency.total)
+
+# Append-only log of frontier pushes, finished visits and article counters,
+# flushed every CHECKPOINT_INTERVAL seconds. Started with --resume, seeds pick
+# up from their checkpointed frontier, visited set and counter.
+CHECKPOINT_PATH = 'crawl_checkpoint.jsonl'
+CHECKPOINT_INTERVAL = 30.0
+checkpoint_store = CheckpointStore(CHECKPOINT_PATH, interval=CHECKPOINT_INTERVAL, log=logger)
+resume_states = {}
+
+# MinHash signatures of stored articles, saved to NEAR_DUPLICATE_INDEX_PATH on exit.
+# A new article at least NEAR_DUPLICATE_THRESHOLD similar to one of them, such as
+# a syndicated copy, is dropped before it reaches the article sinks.
+NEAR_DUPLICATE_INDEX_PATH = 'near_duplicates.minhash'
+NEAR_DUPLICATE_THRESHOLD = 0.8
+near_duplicates = load_index(NEAR_DUPLICATE_INDEX_PATH, NEAR_DUPLICATE_THRESHOLD, log=logger)
+
+# Failed fetches are retried with exponential backoff and jitter per failure kind
+# (see retry.DEFAULT_POLICIES); URLs failing every attempt are appended to
+# DEAD_LETTER_PATH. Each attempt waits longer for the page, so a slow page only
+# ties a worker up for the full minute on its last try.
+NAVIGATION_TIMEOUTS = (15000, 30000, 60000)
+DEAD_LETTER_PATH = 'dead_letters.jsonl'
+dead_letters = DeadLetterLog(DEAD_LETTER_PATH, log=logger)
+
+# Sharded mode: seeds and child URLs are spread over worker processes by host
+# hash, sharing their queue, seen sets and article counters through a backend.
+SHARD_BACKEND_PATH = 'crawl_shards.sqlite3'
+SHARD_POLL_INTERVAL = 1.0
+
+
+def progress(*values):
 
+    """
+    Reports per-URL progress with `print`, or through the logger once 
+    PRINT_PROGRESS is turned off.
+    """
 
-def main(url_id):
+    if PRINT_PROGRESS:
+        print(*values)
+    else:
+        logger.info(' '.join(str(value) for value in values))
+
+
+def configure_export(to_db, export_dir, export_format):
 
     """
-    Main function to extract article URLs from a given seed URL using Playwright.
+    Replaces the article pipeline with one writing to the given sinks.
 
-    This function navigates to the provided seed URL, identifies anchor tags 
-    with child URLs, and extracts URLs that match specific patterns. It then 
-    initiates a multithreading process to parse these URLs concurrently. The 
-    function uses the Playwright library to interact with the web page and a 
-    database instance to manage extracted data.
+    The current pipeline is closed first, so every article queued so far 
+    still reaches the previous sinks.
 
     Args:
-        url_id (int): The identifier for the URL configuration in the database.
+        to_db (bool): Whether articles are written to the bloomberg table.
+        export_dir (str): Directory receiving the exported files, or None for no files.
+        export_format (str): 'jsonl' or 'parquet'.
+    """
+
+    global article_pipeline
+    sinks = build_sinks(logger, db_instance if to_db else None, export_dir, export_format, EXPORT_MAX_ROWS)
+    article_pipeline.close()
+    article_pipeline = ArticlePipeline(logger, sinks, metrics=metrics, batch_size=EXPORT_BATCH_SIZE)
+
+
+def apply_settings(max_depth, incremental, wait_until):
+
+    """
+    Sets the crawl options a spawned shard worker does not inherit.
+
+    Spawned workers import this script afresh without running its command 
+    line handling, so the parent passes its settings along.
+
+    Args:
+        max_depth (int): Value of MAX_DEPTH.
+        incremental (bool): Value of INCREMENTAL.
+        wait_until (str): Value of WAIT_UNTIL.
+    """
+
+    global MAX_DEPTH, INCREMENTAL, WAIT_UNTIL
+    MAX_DEPTH, INCREMENTAL, WAIT_UNTIL = max_depth, incremental, wait_until
+
+
+def close_crawl():
+
+    """
+    Flushes and closes the stores, pools and connections of this process.
+    """
+
+    checkpoint_store.close()
+    scheduler.close()
+    browser_pool.close()
+    http_fetcher.close()
+    seen_store.close()
+    validator_store.close()
+    dead_letters.close()
+    article_pipeline.close()
+    db_instance.close_database()
+
+
+def enable_queue_logging():
+
+    """
+    Moves the root logger's handlers behind a queue drained by a listener thread.
+
+    Crawl threads then only put records on an in-memory queue and never 
+    block on the log file. Per-URL progress goes to the logger instead of 
+    stdout.
 
     Returns:
-        None
+        logging.handlers.QueueListener: The started listener; stop it to flush the queue.
+    """
+
+    global PRINT_PROGRESS
+
+    root = logging.getLogger()
+    handlers = root.handlers[:]
+    log_queue = queue.SimpleQueue()
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    PRINT_PROGRESS = False
+    return listener
+
+
+def load_page(page, url, selector, timeout=60000):
+
+    """
+    Navigates a pooled page to the given URL and waits as set by WAIT_UNTIL.
+
+    The time until the response commits, or a 429 or 503 answer, is reported 
+    to the concurrency controller.
+
+    Args:
+        page (playwright.sync_api.Page): Page leased from the browser pool.
+        url (str): The URL to load.
+        selector (str): Selector awaited when WAIT_UNTIL is 'selector'.
+        timeout (float): Milliseconds allowed for navigating and for waiting.
 
     Raises:
-        TimeoutError: If navigating to the seed URL times out.
+        TimeoutError: If navigating or waiting times out.
         PageError: If an error occurs with Playwright during navigation.
     """
 
-    db_instance = Database(logger)
-    db_instance.create_connection()
-    
-    # Fetch configuration record from the database based on URL ID
-    config_record = db_instance.fetch_record_by_url_id(url_id)
-    if config_record:
-        seed_url = config_record[1]        
-        max_threads = config_record[2]
-        maximum_urls = config_record[3]
-        count = config_record[4]
-        child_url_xpath = config_record[5]
-        article_title_xpth = config_record[6]
-        article_content_xpth = config_record[7]
-        seed_url_re_str = config_record[8]
-        child_url_re_str = config_record[9]
-        delay = config_record[10]
-
-    article_set = set()  
-
-    # Use Playwright to navigate to the seed URL and extract child URLs
-    with sync_playwright() as p:
-       
-        browser = p.chromium.launch(headless=False)
-
-        context = browser.new_context()
-
-        
-        page = context.new_page()
-
-        try:
-            
-            page.goto(seed_url, timeout=60000)
-            logger.info(f"Navigated to seed url {seed_url}")
-
-            
-            page.wait_for_load_state('domcontentloaded')
-            logger.info(f"loaded the url {seed_url}")
-        
-            # Compile regular expressions for URL matching
-            child_re_str = re.compile(child_url_re_str)
-            seed_re_str = re.compile(seed_url_re_str)
-
-            # Locate and process anchor tags
-            anchor_tags = page.locator(child_url_xpath)
-            anchor_elements = anchor_tags.element_handles()   
-            
-
-            for anchor in anchor_elements:
-               
-                href = anchor.get_attribute('href')
-                if href and seed_re_str.match(href):
-                    
-                    article_set.add(href)
-                   
-                if href and child_re_str.match(href):
-                    
-                    full_url = urljoin(seed_url, href)  
-                    article_set.add(full_url)
-                   
-            if article_set:
-                logger.info(f'Getting the child urls  from the seed url {seed_url}')
-            else:
-                logger.info(f'No child urls  from the seed url {seed_url}')
-
-        except TimeoutError:
-            logger.error(f"Timeout error occurred while navigating to seed url {seed_url}")
-        
-        except PageError as e:
-            logger.error(f"An error occurred with Playwright for seed_url {seed_url}: {e.name} and {e.message}")
-        
-        finally:
-            page.close()
-            context.close()
-            browser.close()
-            logger.info(f"Browser closed for seed url {seed_url}")
-
-    # Synchronize access to shared resources
-    with lock:
-        global counters
-        counters[url_id] = count
-        print('starting count : ', counters[url_id])
-        logger.info(f'initialized starting count is {counters[url_id]}')
-
-        max_urls = maximum_urls
-        print('maximum number of urls : ', max_urls)
-        logger.info(f'initialized maximum number of urls are {max_urls}')
-
-        global max_workers
-        max_workers = max_threads
-        print('initialized max_workers for mutlithreading : ', max_workers)
-        logger.info(f'initialized max_workers for mutlithreading are {max_workers}')
-
-        depth_0_urls_list = []
-        
-        if len(article_set) > 0:
-            for child_url in article_set:
-                depth_0_urls_list.append(child_url)
-
-        visited_child_urls_set = article_set
-        
-        delay = delay      
-        time.sleep(60 + random.uniform(5, 15))
-
-        print(f'total child urls from seed url: {seed_url} ', len(depth_0_urls_list))
-        logger.info(f"Found {len(article_set)} child urls from the seed url {depth_0_urls_list}")
-       
-    if len(depth_0_urls_list) > 0 and counters[url_id] < max_urls: 
-        logger.info('Multithreading is started')
-        create_and_start_threads(depth_0_urls_list, delay, max_workers, article_title_xpth, article_content_xpth, url_id, max_urls, visited_child_urls_set)
-    
-    if len(depth_0_urls_list)>0 and counters[url_id] < max_urls:
-        child_urls(depth_0_urls_list, delay, child_url_xpath,  article_title_xpth, article_content_xpth, seed_url_re_str, child_url_re_str, url_id, max_urls, visited_child_urls_set)
-
-# Create a global lock to synchronize access to shared resources
-lock = threading.Lock()
+    with metrics.timer('navigation'):
+        start = time.perf_counter()
+        response = page.goto(url, wait_until='commit', timeout=timeout)
+    if response is not None and response.status in THROTTLE_STATUSES:
+        concurrency.record(url, THROTTLED)
+    else:
+        concurrency.record(url, OK, time.perf_counter() - start)
+    with metrics.timer('dom_load'):
+        if WAIT_UNTIL == 'selector':
+            page.locator(selector).first.wait_for(state='attached', timeout=timeout)
+        elif WAIT_UNTIL != 'commit':
+            page.wait_for_load_state(WAIT_UNTIL, timeout=timeout)
+    logger.info(f"loaded the url {url}")
 
 
-def get_child_urls(url, delay, child_url_xpath, article_title_xpth, article_content_xpth, seed_url_re_str, child_url_re_str, url_id, visited_child_urls_set):
+def render_page(page, url, child_url_xpath, article_title_xpth, article_content_xpth, timeout=60000):
 
     """
-    Extracts article URLs from the given seed URL using Playwright.
+    Navigates a pooled page to the given URL and extracts it in one round trip.
 
-    This function navigates to the provided seed URL, identifies anchor tags 
-    with child URLs, and extracts URLs that match specific patterns. It uses 
-    the Playwright library to interact with the web page.
+    Child url hrefs, the article title and the article content are collected 
+    by a single `page.evaluate` call; selectors passed as None are skipped.
 
     Args:
-        url (str): The seed URL from which to extract article URLs.
-        delay (int): Delay between requests in seconds.
-        child_url_xpath (str): XPath to locate child URLs in the web page.
-        article_title_xpth (str): XPath to locate the article title in the web page.
-        article_content_xpth (str): XPath to locate the article content in the web page.
-        seed_url_re_str (str): Regular expression string to match seed URLs.
-        child_url_re_str (str): Regular expression string to match child URLs.
-        url_id (int): Identifier for the URL configuration in the database.
-        visited_child_urls_set (set): Set of already visited child URLs to avoid duplicates.
+        page (playwright.sync_api.Page): Page leased from the browser pool.
+        url (str): The URL to load.
+        child_url_xpath (str): XPath to locate child URLs, or None.
+        article_title_xpth (str): XPath to locate the article title, or None.
+        article_content_xpth (str): XPath to locate the article content, or None.
+        timeout (float): Milliseconds allowed for navigating and for waiting.
 
     Returns:
-        list: A list of extracted article URLs.
+        dict: `hrefs`, `title` and `content` of the page.
 
     Raises:
-        TimeoutError: If navigating to the seed URL times out.
+        TimeoutError: If navigating to the URL times out.
         PageError: If an error occurs with Playwright during navigation.
     """
 
-    with lock:
+    load_page(page, url, article_content_xpth or child_url_xpath, timeout)
+    with metrics.timer('extraction'):
+        return extract_page(page, child_url_xpath, article_title_xpth, article_content_xpth)
+
 
-        article_set = set()  
-        seed_url = url       
-    
-        with sync_playwright() as p:
-            
-            browser = p.chromium.launch(headless=False)
+def filter_child_urls(url, hrefs, seed_url_re, child_url_re):
 
-            context = browser.new_context()
+    """
+    Keeps the hrefs matching the seed or child URL patterns, in canonical form.
 
-            page = context.new_page()
+    The URLs are canonicalized, so variants that only differ by fragment, 
+    tracking parameters or query order are collected once.
 
-            try:
-                
-                page.goto(seed_url, timeout=60000)
-                logger.info(f"Navigated to seed url {seed_url}")
-    
-                page.wait_for_load_state('domcontentloaded')
-                logger.info(f"loaded the url {seed_url}")
-            
-                # Compile regular expressions for URL matching
-                child_re_str = re.compile(child_url_re_str)
-                seed_re_str= re.compile(seed_url_re_str)
-                
-                # Locate and process anchor tags
-                anchor_tags = page.locator(child_url_xpath)
-                anchor_elements = anchor_tags.element_handles()   
-                
-                for anchor in anchor_elements:
-                    
-                    href = anchor.get_attribute('href')
-                    if href and seed_re_str.match(href):
-                        
-                        article_set.add(href)
-                
-                    if href and child_re_str.match(href):
-                       
-                        full_url = urljoin(seed_url, href)  
-                        article_set.add(full_url)
-                        
-                if article_set:
-                    logger.info(f'Getting the child urls  from the seed url {seed_url}')
-                else:
-                    logger.info(f'No child urls  from the seed url {seed_url}')
-
-            except TimeoutError:
-                logger.error(f"Timeout error occurred while navigating to seed url {seed_url}")
-
-            except PageError as e:
-                logger.error(f"An error occurred with Playwright for seed_url {seed_url}: {e.name} and {e.message}")
-            
-            finally:
-                page.close()
-                context.close()
-                browser.close()
-                logger.info(f"Browser closed for seed url {seed_url}")
-
-        delay = delay
-        # Process and filter child URLs
-        depth_urls = []
-        child_urls_list = list(article_set)
-        print('length :', len(child_urls_list))
-
-        child_urls= []
-        if len(child_urls_list) > 0:
-            for child_url in child_urls_list:
-                print('==========first mutithread=======')
-                if child_url not in visited_child_urls_set:
-                        visited_child_urls_set.add(child_url)
-                        child_urls.append(child_url)
-                        depth_urls.append(child_url)
-                
-            if len(child_urls)>0:
-                print('============== length of child urls : ', len(child_urls))
-                print('======== length of depth urls ===== ', len(depth_urls))
-                create_and_start_threads(child_urls, delay, article_title_xpth, article_content_xpth, url_id)
-
-        time.sleep(30)
-        return depth_urls
-
-
-def parse_url(url, article_title_xpth, article_content_xpth, url_id, max_urls, visited_child_urls_set):
+    Args:
+        url (str): URL of the page the hrefs were found on.
+        hrefs (list): Raw href attribute values.
+        seed_url_re (re.Pattern): Compiled pattern matching seed URLs.
+        child_url_re (re.Pattern): Compiled pattern matching child URLs.
 
+    Returns:
+        set: The matching article URLs.
     """
-    Parses the given URL to extract article information and child URLs.
 
-    This function navigates to the provided URL, extracts the article title and content,
-    identifies child URLs, and stores the extracted information in a database. It
-    uses the Playwright library for web scraping and threading for concurrent processing.
+    article_set = set()
+
+    for href in hrefs:
+
+        if href and seed_url_re.match(href):
+
+            article_set.add(canonicalize_url(href))
+
+        if href and child_url_re.match(href):
+
+            full_url = urljoin(url, href)
+            article_set.add(canonicalize_url(full_url))
+
+    return article_set
+
+
+def has_article(article_details):
+
+    """
+    Tells whether extracted article details hold a title and non-blank content.
+    """
+
+    return (
+        article_details is not None
+        and len(article_details) > 3
+        and bool(article_details[1])
+        and article_details[1] != 'No title found'
+        and bool(article_details[2])
+        and not article_details[2].isspace()
+    )
+
+
+def sitemap_article_urls(config):
+
+    """
+    Yields the canonical article URLs listed in the sitemaps of a seed.
+
+    An entry is kept if the child URL pattern matches its absolute URL or 
+    its path, so relative patterns work as they do for hrefs. Entries older 
+    than SITEMAP_MAX_AGE seconds, disallowed by robots.txt or, outside 
+    incremental mode, already stored are skipped. The sitemaps are streamed, 
+    so the URLs come out while the files are still being read.
 
     Args:
-        url (str): The URL to parse.
-        article_title_xpth (str): XPath to locate the article title.
-        article_content_xpth (str): XPath to locate the article content.
-        url_id (int): Identifier for the URL configuration in the database.
-        max_urls (int): Maximum number of URLs to be processed.
-        visited_child_urls_set (set): Set of already visited child URLs to avoid duplicates.
+        config (CrawlConfig): Config of the seed.
+    """
+
+    since = datetime.now(timezone.utc) - timedelta(seconds=SITEMAP_MAX_AGE) if SITEMAP_MAX_AGE else None
+    sitemaps = config.sitemap_urls or sitemap_ingester.discover(config.seed_url)
+    for url, lastmod in sitemap_ingester.entries(sitemaps, since):
+        parts = urlsplit(url)
+        path = parts.path + (f'?{parts.query}' if parts.query else '')
+        if not (config.child_url_re.match(url) or config.child_url_re.match(path)):
+            continue
+        url = canonicalize_url(url)
+        if INCREMENTAL or url not in seen_store:
+            yield url
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def queue_sitemap_urls(frontier, state, config):
+
+    """
+    Pushes the sitemap article URLs of a seed onto its frontier at depth 1.
+
+    The URLs are marked as visited, so the same articles found again as 
+    child URLs are not queued twice.
+
+    Returns:
+        int: Number of URLs queued.
+    """
+
+    queued = 0
+    for batch in batched(sitemap_article_urls(config), SITEMAP_BATCH_SIZE):
+        for url in state.filter_unvisited(batch):
+            if frontier.push(url, 1):
+                checkpoint_store.record_push(state.url_id, url, 1)
+                queued += 1
+    logger.info(f'Queued {queued} sitemap urls for seed url {config.seed_url}')
+    return queued
+
+
+def is_near_duplicate(url, content):
+
+    """
+    Tells whether `content` is a near duplicate of a stored article.
+
+    Otherwise its signature is added to the near-duplicate index, so later 
+    copies of the article are recognised.
+    """
+
+    signature = minhash(content)
+    if signature is None:
+        return False
+    similarity = near_duplicates.add(signature)
+    if similarity is None:
+        return False
+    logger.info(f'Article {url} is a near duplicate ({similarity:.2f} similar) of a stored article, dropping it')
+    metrics.inc('near_duplicates')
+    return True
+
+
+def main(url_id):
+
+    """
+    Main function to extract article URLs from a given seed URL using Playwright.
+
+    This function navigates to the provided seed URL, identifies anchor tags 
+    with child URLs, and extracts URLs that match specific patterns. It then 
+    crawls the site level by level from a priority frontier. With SITEMAPS 
+    on, the frontier starts from the seed's sitemap URLs instead, and the 
+    seed page is only rendered if they yield none. Every fetch goes 
+    through the host scheduler, which spaces requests to the same host by the 
+    Config `delay`, and leases a page from the shared browser pool. The Config 
+    row comes from the shared config store.
+
+    Args:
+        url_id (int): The identifier for the URL configuration in the database.
 
     Returns:
         None
     """
-     
-    article_details = []     
 
-    if counters[url_id] >= max_urls+1:
+    config = config_store.get(url_id)
+    if config is None:
+        logger.error(f'No Config row for url_id {url_id}')
         return
-    
-    # Set up the Playwright environment
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
-        context = browser.new_context()
-        page = context.new_page()
-        
-        try:
-            current_datetime = datetime.now()
-            formatted_datetime = current_datetime.strftime('%Y:%m:%d %H:%M:%S')
-
-            page.goto(url, timeout=60000)
-            logger.info(f"Navigated to url {url}")
-
-            page.wait_for_load_state('domcontentloaded', timeout=60000)
-            logger.info(f"loaded the url {url}")
-
-            title_tag = page.locator(article_title_xpth)
-
-            if title_tag:
-                title = title_tag.text_content()
-                logger.info(f'article title from the url {url}')
-            else:
-                logger.warning(f"No title found for {url}")
-                title = 'No title found'
-
-            article_details.append(url)
-            print(url)
-            article_details.append(title)
-            
-            content = ''
-            art_content = page.locator(article_content_xpth)
-            article_content = art_content.all_text_contents()
-            content = " ".join(article_content)
-            if content != '':
-                logger.info(f'article content from the url {url}')
-            else:
-                logger.info(f'No article content from the url {url}')
+    seed_url = config.seed_url
+    count = config.count
 
-            article_details.append(content)
-            article_details.append(formatted_datetime)
-        
-        except TimeoutError:
-           
-            logger.error(f"Timeout error occurred while navigating to url {url}")
+    resume_state = resume_states.get(url_id)
+    if resume_state and resume_state.finished:
+        logger.info(f'Seed url {seed_url} finished in the checkpointed run, skipping it')
+        return
 
-        except PageError as e:
-            
-            logger.error(f"An error occurred with Playwright for url {url}: {e.name} and {e.message}")
-        finally:
-            page.close()
-            context.close()
-            browser.close()
-            logger.info(f"Browser closed for url {url}")
+    # Per-seed state, so no other seed waits on this one
+    if resume_state:
+        count = max(count, resume_state.count or 0)
+        state = CrawlState(url_id, count, visited=resume_state.visited, load_stats=PageLoadStats(),
+                           recrawl_stats=RecrawlStats(), limit=config.maximum_urls)
+    else:
+        state = CrawlState(url_id, count, load_stats=PageLoadStats(), recrawl_stats=RecrawlStats(), limit=config.maximum_urls)
+    crawl_states[url_id] = state
+    checkpoint_store.track(state)
+    print('starting count : ', state.count)
+    logger.info(f'initialized starting count is {state.count}')
+
+    max_urls = config.maximum_urls
+    print('maximum number of urls : ', max_urls)
+    logger.info(f'initialized maximum number of urls are {max_urls}')
+
+    max_workers = config.max_threads
+    print('initialized max_workers for mutlithreading : ', max_workers)
+    logger.info(f'initialized max_workers for mutlithreading are {max_workers}')
+
+    # The seed URL is the only depth 0 entry; its child URLs are depth 1.
+    # A resumed seed starts from the URLs it had queued but not finished.
+    frontier = Frontier(max_depth=MAX_DEPTH, max_in_memory=FRONTIER_MEMORY_LIMIT)
+    active_frontiers[url_id] = frontier
+    if resume_state:
+        for url, depth in resume_state.pending.items():
+            frontier.push(url, depth)
+        logger.info(f'Resuming seed url {seed_url} with {len(frontier)} queued urls and count {state.count}')
+    elif not (SITEMAPS and queue_sitemap_urls(frontier, state, config)):
+        frontier.push(canonicalize_url(seed_url), 0)
+        checkpoint_store.record_push(url_id, canonicalize_url(seed_url), 0)
+
+    try:
+        if not state.budget.exhausted:
+            logger.info('Multithreading is started')
+            crawl_frontier(frontier, state)
+        checkpoint_store.record_finished(url_id)
+    finally:
+        active_frontiers.pop(url_id, None)
+        frontier.close()
+
+    print(f'page loads for seed url {seed_url}: {state.load_stats.summary()}')
+    logger.info(f'Page loads for seed url {seed_url}: {state.load_stats.summary()}')
+    print(f'articles for seed url {seed_url}: {state.recrawl_stats.summary()}')
+    logger.info(f'Articles for seed url {seed_url}: {state.recrawl_stats.summary()}')
+
+
+def measure_blocking(url_id):
 
-        time.sleep(2)
+    """
+    Reports the bytes saved and the change in load time from request blocking.
 
-    print('lenth of visited set before : ', len(visited_child_urls_set))
-    print('article details : ', article_details)
+    The seed URL of the Config row is loaded once without and once with the 
+    pool's request blocking, and the difference is printed and logged.
 
-    if article_details:
-            
-            if len(article_details)>3 and article_details[1] != 'No title found' and article_details[2] != '' and not article_details[2].isspace():
-                if '\n' in article_details[2]:
-                    article_details[2]=article_details[2].replace('\n', '')
+    Args:
+        url_id (int): The identifier for the URL configuration in the database.
+    """
+
+    config = config_store.get(url_id)
+    if config is None:
+        return
+    seed_url, headless = config.seed_url, config.headless
+    wait_until = 'domcontentloaded' if WAIT_UNTIL == 'selector' else WAIT_UNTIL
+
+    try:
+        result = browser_pool.compare_blocking(seed_url, wait_until=wait_until, headless=headless)
+    except (TimeoutError, PageError) as e:
+        logger.error(f"Could not measure request blocking for seed url {seed_url}: {e}")
+        return
+
+    saved_bytes = result['full_bytes'] - result['lean_bytes']
+    saved_seconds = result['full_seconds'] - result['lean_seconds']
+    report = (f"{seed_url}: {result['full_bytes'] / 1024:.0f} KiB -> {result['lean_bytes'] / 1024:.0f} KiB "
+              f"({saved_bytes / 1024:.0f} KiB saved, {result['blocked_requests']} requests blocked), "
+              f"load {result['full_seconds']:.2f}s -> {result['lean_seconds']:.2f}s ({saved_seconds:+.2f}s saved)")
+    print(report)
+    logger.info(f'Request blocking for url_id {url_id}: {report}')
+
+
+def fetch_page(url, child_url_xpath, article_title_xpth, article_content_xpth, state, headless, fetch_mode, validators=None,
+               timeout=60000):
+
+    """
+    Fetches the given URL once and extracts its child url hrefs and article fields.
+
+    In 'http' mode the page is read from the server HTML with lxml, in 
+    'browser' mode it is rendered on a page leased from the shared browser 
+    pool, and 'auto' tries HTTP first and renders the page only when the 
+    article (or, for pages parsed only for links, the child URLs) comes back 
+    empty. With validators of an earlier fetch, the HTTP request is 
+    conditional and an unchanged page is not extracted at all. In 'http' 
+    mode, a request that timed out, could not connect or got a 5xx answer 
+    raises `FetchFailed`, so the URL is retried like a failed navigation. 
+    A 429 or 503 answer raises in 'auto' mode too instead of falling back 
+    to the browser, which would hit the throttling host again at once.
 
-                if db_instance.store_db(article_details):
-                    print(f"Counter: {counters[url_id]}")
-                    counters[url_id] += 1
-        
-            if counters[url_id] >= max_urls+1: 
-                print("Threshold reached!")
-                
+    Args:
+        url (str): The URL to fetch.
+        child_url_xpath (str): XPath to locate child URLs, or None.
+        article_title_xpth (str): XPath to locate the article title, or None.
+        article_content_xpth (str): XPath to locate the article content, or None.
+        state (CrawlState): Counter, visited set and load stats of the seed being crawled.
+        headless (bool): Whether the pooled browser runs headless for this seed.
+        fetch_mode (str): 'browser', 'http' or 'auto'.
+        validators (tuple, optional): `(etag, last_modified, content_hash)` of the stored article.
+        timeout (float): Milliseconds allowed for the HTTP request and for the browser navigation.
 
-def create_and_start_threads(child_urls_list, delay, max_workers, article_title_xpth, article_content_xpth, url_id, max_urls, visited_child_urls_set):
+    Returns:
+        dict: `hrefs`, `title` and `content` of the page, `NOT_MODIFIED` if 
+        the server answered a conditional request with 304, or None.
 
+    Raises:
+        TimeoutError: If navigating to the URL times out.
+        PageError: If an error occurs with Playwright during navigation.
+        FetchFailed: If the HTTP request was throttled or, in 'http' mode, failed in a way worth retrying.
     """
-    Creates and starts threads to parse URLs concurrently using ThreadPoolExecutor.
 
-    This function initiates a pool of threads to process URLs from the provided `child_urls_list`.
-    It stops creating new threads if the maximum URL limit is reached and logs the status.
+    extracted = None
+    etag, last_modified = validators[:2] if validators else (None, None)
+
+    if fetch_mode in ('http', 'auto'):
+        extracted = http_fetcher.extract_page(url, child_url_xpath, article_title_xpth, article_content_xpth,
+                                              etag=etag, last_modified=last_modified, timeout=timeout / 1000,
+                                              raise_failures=fetch_mode == 'http')
+        if extracted is NOT_MODIFIED:
+            return extracted
+        if fetch_mode == 'auto' and extracted is not None:
+            if article_title_xpth:
+                complete = has_article([url, extracted['title'], extracted['content'], None])
+            else:
+                complete = bool(extracted['hrefs'])
+            if not complete:
+                logger.info(f'HTTP extraction came back empty for {url}, rendering it in the browser')
+                extracted = None
+
+    if extracted is None and fetch_mode != 'http':
+        extracted = browser_pool.run(render_page, url, child_url_xpath, article_title_xpth, article_content_xpth, timeout,
+                                     headless=headless, stats=state.load_stats)
+
+    return extracted
+
+
+def parse_url(url, child_url_xpath, article_title_xpth, article_content_xpth, seed_url_re, child_url_re, state, reservation, headless, fetch_mode, attempt=1):
+
+    """
+    Parses the given URL to extract article information and child URLs.
+
+    The page is fetched once. If article XPaths and a budget reservation are 
+    given, the article title and content are stored in the database and the 
+    reservation is committed; if a child url XPath is given, 
+    the anchors matching the seed or child URL patterns are collected, URLs 
+    already visited for the seed are dropped and the remaining ones are marked 
+    as visited.
+
+    In incremental mode an article stored by an earlier run is fetched with 
+    a conditional request. If the server reports it unchanged, or its content 
+    hash matches, nothing is written, and the page is not searched for child 
+    URLs after a 304 since it has no body; a changed article is updated in 
+    place instead of being inserted again.
+
+    The page gets the `attempt`-th of the NAVIGATION_TIMEOUTS. A navigation 
+    timeout or Playwright error is raised as `FetchFailed`, so the caller can 
+    retry the URL.
 
     Args:
-        child_urls_list (list): List of child URLs to be processed.
-        delay (int): Delay in seconds between processing each URL.
-        max_workers (int): Maximum number of worker threads.
-        article_title_xpth (str): XPath to locate the article title.
-        article_content_xpth (str): XPath to locate the article content.
-        url_id (int): Identifier for the URL configuration in the database.
-        max_urls (int): Maximum number of URLs to be processed.
-        visited_child_urls_set (set): Set of already visited child URLs to avoid duplicates.
+        url (str): The URL to parse.
+        child_url_xpath (str): XPath to locate child URLs, or None to skip link discovery.
+        article_title_xpth (str): XPath to locate the article title, or None to skip the article.
+        article_content_xpth (str): XPath to locate the article content, or None to skip the article.
+        seed_url_re (re.Pattern): Compiled pattern matching seed URLs.
+        child_url_re (re.Pattern): Compiled pattern matching child URLs.
+        state (CrawlState): Budget, visited set and load stats of the seed being crawled.
+        reservation (Reservation): Article slot reserved from the seed's budget, or None to skip the article.
+        headless (bool): Whether the pooled browser runs headless for this seed.
+        fetch_mode (str): 'browser', 'http' or 'auto'.
+        attempt (int): Number of this try of the URL, starting at 1.
 
     Returns:
-        None
+        list: A list of newly discovered article URLs.
+
+    Raises:
+        FetchFailed: If the page could not be loaded.
+    """
+
+    if reservation is None:
+        article_title_xpth = article_content_xpth = None
+    if not (child_url_xpath or article_title_xpth):
+        return []
+
+    formatted_datetime = datetime.now().strftime('%Y:%m:%d %H:%M:%S')
+
+    validators = validator_store.get(url) if INCREMENTAL and article_title_xpth else None
+
+    try:
+        with metrics.timer('page'):
+            extracted = fetch_page(url, child_url_xpath, article_title_xpth, article_content_xpth, state, headless, fetch_mode, validators,
+                                   escalated_timeout(NAVIGATION_TIMEOUTS, attempt))
+
+    except TimeoutError as e:
+        logger.error(f"Timeout error occurred while navigating to url {url} (attempt {attempt})")
+        metrics.inc('errors', type=type(e).__name__)
+        concurrency.record(url, TIMEOUT)
+        raise FetchFailed(url, TIMEOUT_FAILURE, str(e)) from e
+
+    except PageError as e:
+        logger.error(f"An error occurred with Playwright for url {url}: {e.name} and {e.message} (attempt {attempt})")
+        metrics.inc('errors', type=type(e).__name__)
+        concurrency.record(url, ERROR)
+        raise FetchFailed(url, classify_page_error(e.message), e.message) from e
+
+    if extracted is None:
+        return []
+
+    metrics.inc('pages')
+
+    if extracted is NOT_MODIFIED:
+        logger.info(f'Article {url} was not modified since the last crawl')
+        state.recrawl_stats.record('not_modified')
+        return []
+
+    if article_title_xpth:
+        article_details = [url, extracted['title'] or '', extracted['content'], formatted_datetime]
+        progress('article details : ', article_details)
+
+        if has_article(article_details):
+            digest = content_hash(article_details[1], article_details[2])
+            if validators and validators[2] == digest:
+                logger.info(f'Article {url} is unchanged since the last crawl')
+                state.recrawl_stats.record('unchanged')
+            elif url in seen_store:
+                if article_pipeline.update(article_details):
+                    state.recrawl_stats.record('updated')
+            elif is_near_duplicate(url, article_details[2]):
+                state.recrawl_stats.record('duplicate')
+                digest = None
+            elif article_pipeline.store(article_details):
+                seen_store.add(url)
+                state.recrawl_stats.record('new')
+                progress(f"Counter: {reservation.commit()}")
+            if digest:
+                validator_store.put(url, extracted.get('etag'), extracted.get('last_modified'), digest)
+        else:
+            logger.info(f'No article content from the url {url}')
+
+        if state.budget.exhausted:
+            progress("Threshold reached!")
+
+    if not child_url_xpath:
+        return []
+
+    # Process and filter child URLs
+    article_set = filter_child_urls(url, extracted['hrefs'], seed_url_re, child_url_re)
+    if article_set:
+        logger.info(f'Getting the child urls  from the url {url}')
+    else:
+        logger.info(f'No child urls  from the url {url}')
+
+    depth_urls = state.filter_unvisited(article_set)
+    progress('======== length of depth urls ===== ', len(depth_urls))
+    return depth_urls
+
+
+def crawl_frontier(frontier, state):
     """
-    
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = []    
+    Crawls the URLs of a frontier until it is empty or the seed's article budget is spent.
+
+    Entries are popped in priority order and handed to the host scheduler, 
+    which fetches each page once. Every URL below depth 0 that is not in the 
+    seen store yet, or every one in incremental mode, is parsed as an article, and every URL shallower than the 
+    frontier's maximum depth is searched for further child URLs in the same 
+    visit; these are pushed back one level deeper. 
+    An article fetch is only scheduled after reserving a slot of the budget, 
+    which is released again unless the article gets stored, so the crawl 
+    never stores more than `maximum_urls` articles. While every free slot is 
+    held by a fetch in flight, the next article waits for one to finish. 
+    Only a small window of URLs is scheduled at a time, so the backlog stays 
+    in the frontier, which bounds its memory and spills to disk. Once the 
+    budget is spent, the budget cancels every scheduled URL that has not 
+    started. Pushes and finished visits are logged to the checkpoint store.
+
+    A URL whose fetch fails is retried from the seed's retry queue once its 
+    backoff has passed, ahead of the frontier, and only recorded as visited 
+    once it succeeds or is dead-lettered.
+
+    The seed's `CrawlConfig` is looked up in the config store on every round, 
+    so edits to its Config row, including `maximum_urls`, apply to the 
+    running crawl.
 
-        for url in child_urls_list:
-            if counters[url_id] < max_urls+1:
-                time.sleep(delay)
-                futures.append(executor.submit(parse_url, url, article_title_xpth, article_content_xpth, url_id, max_urls, visited_child_urls_set))
+    Args:
+        frontier (Frontier): Frontier holding the URLs still to crawl.
+        state (CrawlState): Budget, visited set and load stats of the seed being crawled.
+    """
+
+    in_flight = {}
+    deferred = None
+    ready = []
+    retries = RetryQueue(dead_letters, metrics=metrics)
+    budget = state.budget
+
+    while (len(frontier) > 0 or deferred or ready or retries or in_flight) and not budget.exhausted:
+        config = config_store.get(state.url_id)
+        if config is None:
+            logger.warning(f'Config row of url_id {state.url_id} was removed, stopping its crawl')
+            break
+        budget.limit = config.maximum_urls
+        # Keep twice the seed host's current adaptive limit scheduled
+        window = max(1, config.max_threads, concurrency.limit(concurrency.host(config.seed_url))) * 2
+
+        ready.extend((entry.url, entry.depth, entry.attempt) for entry in retries.pop_due())
+        while (deferred or ready or len(frontier) > 0) and len(in_flight) < window:
+            if deferred:
+                url, depth, attempt = deferred
+            elif ready:
+                url, depth, attempt = ready.pop(0)
             else:
-                executor.shutdown(wait=False, cancel_futures=True)
-                logger.info('Multithreading is stopped')  
+                url, depth = frontier.pop()
+                attempt = 1
+            deferred = None
+            want_article = depth > 0 and (INCREMENTAL or url not in seen_store)
+            want_links = frontier.max_depth is None or depth < frontier.max_depth
+            reservation = budget.reserve() if want_article else None
+            if want_article and reservation is None:
+                deferred = (url, depth, attempt)
                 break
+            if not (want_article or want_links):
+                checkpoint_store.record_done(state.url_id, url)
+                continue
+            future = scheduler.submit(url, parse_url, url,
+                                      config.child_url_xpath if want_links else None,
+                                      config.article_title_xpth if want_article else None,
+                                      config.article_content_xpth if want_article else None,
+                                      config.seed_url_re, config.child_url_re, state, reservation, config.headless,
+                                      config.fetch_mode, attempt, delay=config.delay, max_active=config.max_threads,
+                                      ceiling=config.max_concurrency)
+            budget.track(future)
+            in_flight[future] = (url, depth, attempt, reservation)
+
+        if not in_flight:
+            if not retries:
+                break
+            # Nothing to fetch until the next failed URL is due again
+            with metrics.timer('sleep'):
+                time.sleep(retries.next_due())
+            continue
+
+        done, _ = wait(in_flight, timeout=retries.next_due(), return_when=FIRST_COMPLETED)
+        for future in done:
+            url, depth, attempt, reservation = in_flight.pop(future)
+            if reservation:
+                reservation.release()
+            if future.cancelled():
+                continue
+            try:
+                depth_urls = future.result()
+            except FetchFailed as e:
+                if not retries.schedule(state.url_id, url, depth, attempt, e.kind, e.message):
+                    checkpoint_store.record_done(state.url_id, url)
+                continue
+            except Exception as e:
+                logger.error(f"Error extracting child urls from {url}: {e}")
+                metrics.inc('errors', type=type(e).__name__)
+                checkpoint_store.record_done(state.url_id, url)
+                continue
+            for child_url in depth_urls:
+                if frontier.push(child_url, depth + 1):
+                    checkpoint_store.record_push(state.url_id, child_url, depth + 1)
+            checkpoint_store.record_done(state.url_id, url)
+            progress(f'{len(depth_urls)} child urls at depth {depth + 1} from {url}, frontier size {len(frontier)}')
+
+    if in_flight:
+        for future, (url, depth, attempt, reservation) in in_flight.items():
+            future.cancel()
+            if reservation:
+                reservation.release()
+        logger.info('Multithreading is stopped')
+
+
+def seed_shards(backend, url_ids, num_shards):
+
+    """
+    Queues the seed URL of every Config row on the shard owning its host.
+
+    Seeds already seen by the backend are not queued again, so several 
+    coordinators may seed the same backend. With SITEMAPS on, the sitemap 
+    URLs of a seed are queued at depth 1 on the shards owning their hosts 
+    instead of the seed URL, unless there are none.
+
+    Args:
+        backend (CrawlBackend): Backend shared by every shard.
+        url_ids (list): Identifiers of the Config rows to crawl.
+        num_shards (int): Number of shards of the crawl.
+    """
 
+    for url_id in url_ids:
+        config = config_store.get(url_id)
+        if config is None:
+            continue
+        seed_url = canonicalize_url(config.seed_url)
+        backend.init_seed(url_id, config.count)
+        queued = 0
+        if SITEMAPS:
+            for batch in batched(sitemap_article_urls(config), SITEMAP_BATCH_SIZE):
+                for url in backend.mark_seen(url_id, batch):
+                    backend.push(shard_for(url, num_shards), url_id, url, 1)
+                    queued += 1
+            logger.info(f'Queued {queued} sitemap urls for seed url {seed_url}')
+        if not queued and backend.mark_seen(url_id, [seed_url]):
+            backend.push(shard_for(seed_url, num_shards), url_id, seed_url, 0)
+            logger.info(f'Queued seed url {seed_url} on shard {shard_for(seed_url, num_shards)}')
+
+
+def crawl_shard(backend, shard, num_shards, export=None, settings=None):
 
-def child_urls(child_urls_list, delay, child_url_xpath, article_title_xpth, article_content_xpth, seed_url_re_str, child_url_re_str, url_id, max_urls, visited_child_urls_set):
     """
-    Recursively extracts and processes child URLs using multithreading.
-    
-    This function takes a list of initial child URLs and uses a thread pool to process each URL concurrently. It extracts further child URLs from each processed URL, adding them to a depth list for further processing. The function runs recursively until the maximum URL limit is reached or there are no more child URLs to process.
-    
+    Runs one worker of a sharded crawl until no shard has work left.
+
+    The worker leases the URLs of its shard from the backend, fetches them 
+    through its own host scheduler, browser pool and article pipeline, and 
+    queues every new child URL on the shard owning its host. Article slots are 
+    reserved in the backend before the fetch, so `maximum_urls` holds across 
+    every shard; an article whose slots are all held by fetches in flight 
+    waits in this worker until one is released, and no further URLs are 
+    leased meanwhile, so the rest of the shard stays available to other 
+    workers. Since 
+    a host always maps to the same shard, the local seen and validator stores 
+    only ever see the URLs of their own hosts. A failed URL keeps its lease 
+    while it waits in the worker's retry queue, so the crawl does not end 
+    before its last attempt. The worker sends a heartbeat on every round; 
+    should another worker stop sending them, its leases and reserved slots 
+    are given back and the URLs of its shard are taken over by this one.
+
     Args:
-        child_urls_list (list): List of initial child URLs to process.
-        delay (int): Delay in seconds between processing each URL.
-        child_url_xpath (str): XPath to locate child URLs within a page.
-        article_title_xpth (str): XPath to locate the article title.
-        article_content_xpth (str): XPath to locate the article content.
-        seed_url_re_str (str): Regular expression for validating seed URLs.
-        child_url_re_str (str): Regular expression for validating child URLs.
-        url_id (int): Identifier for the URL configuration in the database.
-        max_urls (int): Maximum number of URLs to process.
-        visited_child_urls_set (set): Set of already visited child URLs to avoid duplicates.
-    """
-        
-    depth_urls = []
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        futures = []
-        for url in child_urls_list:
-            if counters[url_id] < max_urls+1:
-                time.sleep(delay)
-                futures.append(executor.submit(get_child_urls, url, delay, child_url_xpath, article_title_xpth, article_content_xpth, seed_url_re_str, child_url_re_str, url_id, visited_child_urls_set))
+        backend (CrawlBackend): Backend shared by every shard.
+        shard (int): Shard run by this worker.
+        num_shards (int): Number of shards of the crawl.
+        export (tuple, optional): `configure_export` arguments for a spawned 
+            worker, which does not see the options of the parent process.
+        settings (tuple, optional): `apply_settings` arguments for a spawned worker.
+    """
+
+    if export is not None:
+        configure_export(*export)
+    if settings is not None:
+        apply_settings(*settings)
+    # Every shard process writes to the same seen and validator files, so no
+    # process may hold their write lock across more than one addition
+    seen_store.commit_every = validator_store.commit_every = 1
+    logger.info(f'Shard {shard} of {num_shards} started')
+    states = {}
+    in_flight = {}
+    deferred = []
+    retries = RetryQueue(dead_letters, metrics=metrics)
+    window = SCHEDULER_WORKERS * 2
+
+    while True:
+        # Keeps the leases of deferred, retried and in-flight URLs alive
+        backend.heartbeat(shard)
+        retry, deferred = deferred, []
+        retry.extend((entry.payload, entry.url_id, entry.url, entry.depth, entry.attempt) for entry in retries.pop_due())
+        while len(in_flight) < window:
+            if retry:
+                entry = retry.pop()
             else:
-                executor.shutdown(wait=False, cancel_futures=True)
-                logger.info('Multithreading is stopped')  
+                entry = backend.pop(shard)
+                if entry is None:
+                    break
+                entry = entry + (1,)
+            entry_id, url_id, url, depth, attempt = entry
+            config = config_store.get(url_id)
+            if config is None:
+                backend.done(entry_id)
+                continue
+            if url_id not in states:
+                states[url_id] = SharedCrawlState(backend, url_id, load_stats=PageLoadStats(), recrawl_stats=RecrawlStats())
+            state = states[url_id]
+            state.budget.limit = config.maximum_urls
+            want_article = depth > 0 and (INCREMENTAL or url not in seen_store)
+            want_links = MAX_DEPTH is None or depth < MAX_DEPTH
+            if state.budget.exhausted or not (want_article or want_links):
+                backend.done(entry_id)
+                continue
+            reservation = state.budget.reserve(entry_id) if want_article else None
+            if want_article and reservation is None:
+                # No slot is free until a fetch in flight finishes, so leasing more rows would only hoard them
+                deferred.append(entry)
                 break
-
-        for future in as_completed(futures):
+            future = scheduler.submit(url, parse_url, url,
+                                      config.child_url_xpath if want_links else None,
+                                      config.article_title_xpth if want_article else None,
+                                      config.article_content_xpth if want_article else None,
+                                      config.seed_url_re, config.child_url_re, state, reservation, config.headless,
+                                      config.fetch_mode, attempt, delay=config.delay, max_active=config.max_threads,
+                                      ceiling=config.max_concurrency)
+            state.budget.track(future)
+            in_flight[future] = (entry_id, url_id, url, depth, attempt, reservation)
+        deferred.extend(retry)
+
+        if not in_flight:
+            if not retries and backend.idle():
+                break
+            # Other shards are still working and may queue URLs or release slots
+            with metrics.timer('sleep'):
+                time.sleep(SHARD_POLL_INTERVAL)
+            continue
+
+        done, _ = wait(in_flight, timeout=SHARD_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+        for future in done:
+            entry_id, url_id, url, depth, attempt, reservation = in_flight.pop(future)
+            if reservation:
+                reservation.release()
+            if future.cancelled():
+                backend.done(entry_id)
+                continue
             try:
-                values = future.result()
-                depth_urls += values
-                print('-------------------------------------------------')
+                depth_urls = future.result()
+            except FetchFailed as e:
+                if retries.schedule(url_id, url, depth, attempt, e.kind, e.message, payload=entry_id):
+                    continue
+                depth_urls = []
             except Exception as e:
-                print(f"Error storing data: {e}")
+                logger.error(f"Error extracting child urls from {url}: {e}")
+                metrics.inc('errors', type=type(e).__name__)
+                depth_urls = []
+            for child_url in depth_urls:
+                backend.push(shard_for(child_url, num_shards), url_id, child_url, depth + 1)
+            backend.done(entry_id)
+
+    for url_id, state in states.items():
+        logger.info(f'Shard {shard} finished url_id {url_id}: {state.load_stats.summary()}; {state.recrawl_stats.summary()}')
+    article_pipeline.close()
+    near_duplicates.save(f'{NEAR_DUPLICATE_INDEX_PATH}.shard{shard}')
+
+
+def shard_worker(backend, shard, num_shards, export, settings):
+
+    """
+    Entry point of a spawned shard process.
 
+    Runs `crawl_shard` and then closes everything the process opened, so 
+    the last seen URLs, validators and articles are committed before it exits.
+    """
+
+    try:
+        crawl_shard(backend, shard, num_shards, export, settings)
+    finally:
+        close_crawl()
+
+
+def run_sharded(backend, url_ids, num_shards, shard=None, export=None, settings=None):
+
+    """
+    Seeds the backend and runs the shard workers.
 
-    print('length of depth urls  ---->>>>> ', len(depth_urls))
-    if counters[url_id] < max_urls+1:
-        child_urls(depth_urls, delay, child_url_xpath, article_title_xpth, article_content_xpth, seed_url_re_str, child_url_re_str, url_id, max_urls, visited_child_urls_set)
-    
+    Without `shard`, the backend is reset and every shard runs in its own 
+    local process. With `shard`, only that worker runs in this process, 
+    joining a crawl whose other shards run elsewhere against the same backend.
 
-with ThreadPoolExecutor(max_workers=2) as executor:
-    executor.map(main, url_ids)
+    Args:
+        backend (CrawlBackend): Backend shared by every shard.
+        url_ids (list): Identifiers of the Config rows to crawl.
+        num_shards (int): Number of shards of the crawl.
+        shard (int, optional): Single shard to run in this process.
+        export (tuple, optional): `configure_export` arguments for the spawned workers.
+        settings (tuple, optional): `apply_settings` arguments for the spawned workers.
+    """
+
+    if shard is None:
+        backend.reset()
+    seed_shards(backend, url_ids, num_shards)
+
+    if shard is not None:
+        crawl_shard(backend, shard, num_shards)
+        return
 
-db_instance.close_database()
\ No newline at end of file
+    # Spawned workers import this script afresh and build their own browser
+    # pool, scheduler and article pipeline; forked threads would not survive
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=shard_worker, args=(backend, i, num_shards, export, settings), name=f'shard-{i}')
+               for i in range(num_shards)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        if worker.exitcode:
+            logger.error(f'{worker.name} exited with code {worker.exitcode}')
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Crawl the seed urls configured in the Config table.')
+    parser.add_argument('--engine', choices=('threads', 'async'), default='threads',
+                        help='threads runs a thread per page on the browser pool, async drives all pages from one event loop')
+    parser.add_argument('--max-depth', type=int, default=MAX_DEPTH,
+                        help='deepest link level followed from each seed url, unlimited by default')
+    parser.add_argument('--wait-until', choices=('commit', 'domcontentloaded', 'selector'), default=WAIT_UNTIL,
+                        help='load state awaited after navigation; selector waits only for the article content or child url anchors')
+    parser.add_argument('--measure-blocking', action='store_true',
+                        help='load every seed url with and without request blocking and report the savings instead of crawling')
+    parser.add_argument('--resume', action='store_true',
+                        help=f'continue the crawl checkpointed in {CHECKPOINT_PATH} instead of starting over')
+    parser.add_argument('--sitemaps', action='store_true',
+                        help=f'queue the article urls of each seed\'s sitemaps changed in the last {SITEMAP_MAX_AGE // 3600} hours instead of rendering the seed page')
+    parser.add_argument('--incremental', action='store_true',
+                        help='fetch stored articles again with conditional requests, skip unchanged ones and update changed ones in place')
+    parser.add_argument('--shards', type=int,
+                        help='spread the seeds and their child urls over this many worker processes by host hash')
+    parser.add_argument('--shard', type=int,
+                        help=f'run only this shard against the backend in {SHARD_BACKEND_PATH}, to add a worker to a running sharded crawl')
+    parser.add_argument('--metrics-port', type=int, default=METRICS_PORT,
+                        help='serve Prometheus text metrics on http://127.0.0.1:PORT/metrics')
+    parser.add_argument('--metrics-json', default=METRICS_JSON_PATH,
+                        help=f'dump the metrics as JSON to this file every {METRICS_INTERVAL:g} seconds')
+    parser.add_argument('--export-dir', default=EXPORT_DIR,
+                        help=f'also write every stored article to rotated files of {EXPORT_MAX_ROWS} articles in this directory')
+    parser.add_argument('--export-format', choices=EXPORT_FORMATS, default=EXPORT_FORMAT,
+                        help='gzip compressed JSON lines, or Parquet (requires pyarrow)')
+    parser.add_argument('--no-db', action='store_true',
+                        help='do not write articles to the bloomberg table, only to the --export-dir files')
+    parser.add_argument('--queue-logging', action='store_true',
+                        help='log through a background queue listener and send per-url progress to the log instead of stdout')
+    args = parser.parse_args()
+    if args.shard is not None and not args.shards:
+        parser.error('--shard requires --shards')
+    if args.shards and (args.resume or args.engine != 'threads'):
+        parser.error('--shards only supports the threads engine without --resume')
+    if args.resume and args.engine != 'threads':
+        parser.error('--resume is only supported by the threads engine')
+    if args.incremental and args.engine != 'threads':
+        parser.error('--incremental is only supported by the threads engine')
+    if args.sitemaps and args.engine != 'threads':
+        parser.error('--sitemaps is only supported by the threads engine')
+    if args.no_db and not args.export_dir:
+        parser.error('--no-db requires --export-dir')
+    INCREMENTAL = args.incremental
+    SITEMAPS = args.sitemaps
+    export = (not args.no_db, args.export_dir, args.export_format)
+    if export != (EXPORT_TO_DB, EXPORT_DIR, EXPORT_FORMAT):
+        configure_export(*export)
+
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda signum, frame: config_store.expire())
+
+    log_listener = enable_queue_logging() if args.queue_logging else None
+    metrics_server = MetricsServer(metrics, args.metrics_port) if args.metrics_port else None
+    metrics_dumper = MetricsDumper(metrics, args.metrics_json, METRICS_INTERVAL) if args.metrics_json else None
+    MAX_DEPTH = args.max_depth
+    WAIT_UNTIL = args.wait_until
+
+    if args.measure_blocking:
+        for url_id in url_ids:
+            measure_blocking(url_id)
+    elif args.shards:
+        run_sharded(SQLiteBackend(SHARD_BACKEND_PATH), url_ids, args.shards, args.shard, export,
+                    (MAX_DEPTH, INCREMENTAL, WAIT_UNTIL))
+    elif args.engine == 'async':
+        crawler = AsyncCrawler(logger, db_instance, headless=HEADLESS, max_pages=BROWSER_POOL_SIZE, seen_store=seen_store,
+                               metrics=metrics, configs=config_store, sink=article_pipeline, near_duplicates=near_duplicates)
+        metrics.gauge('active_pages', lambda: crawler.active_pages)
+        asyncio.run(crawler.crawl(url_ids))
+    else:
+        if args.resume:
+            resume_states = checkpoint_store.load()
+        checkpoint_store.start(resume=args.resume)
+        # Seed threads only wait on the scheduler, so every seed can run at once
+        with ThreadPoolExecutor(max_workers=max(1, len(url_ids))) as executor:
+            executor.map(main, url_ids)
+
+    near_duplicates.save(NEAR_DUPLICATE_INDEX_PATH)
+    close_crawl()
+    if metrics_server:
+        metrics_server.close()
+    if metrics_dumper:
+        metrics_dumper.close()
+    if log_listener:
+        log_listener.stop()
\ No newline at end of file
@@ -0,0 +1,102 @@
+import hashlib
+import sqlite3
+import threading
+from collections import Counter
+
+
+def content_hash(title, content):
+    """
+    Returns the hex digest identifying the stored version of an article.
+    """
+
+    return hashlib.sha256(f'{title}\0{content}'.encode('utf-8')).hexdigest()
+
+
+class RecrawlStats:
+    """
+    Thread-safe counts of what an incremental crawl did with the articles of one seed.
+
+    Outcomes are `new` (inserted), `updated` (content changed, updated in
+    place), `unchanged` (fetched but the content hash matched) and
+    `not_modified` (the server answered 304 to a conditional request), and
+    `duplicate` (a near duplicate of a stored article, not stored).
+    """
+
+    OUTCOMES = ('new', 'updated', 'unchanged', 'not_modified', 'duplicate')
+
+    def __init__(self):
+        self.outcomes = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, outcome):
+        with self._lock:
+            self.outcomes[outcome] += 1
+
+    def summary(self):
+        with self._lock:
+            fetched = self.outcomes['new'] + self.outcomes['updated'] + self.outcomes['unchanged']
+            skipped = self.outcomes['unchanged'] + self.outcomes['not_modified']
+            return (f'{fetched} fetched, {skipped} skipped ({self.outcomes["not_modified"]} not modified), '
+                    f'{self.outcomes["updated"]} updated, {self.outcomes["new"]} new, '
+                    f'{self.outcomes["duplicate"]} near duplicates dropped')
+
+
+class ValidatorStore:
+    """
+    Persistent ETag, Last-Modified and content hash of every stored article.
+
+    The validators of an article are recorded whenever it is stored, so a
+    later incremental run can send a conditional request for it and, when the
+    server does not support those, still tell from the content hash whether
+    the article changed. Like the seen store, the file uses WAL so several
+    processes may share it if each commits every write.
+
+    Args:
+        path (str): Path of the SQLite file.
+        commit_every (int): Number of writes between two commits.
+        timeout (float): Seconds to wait for a write lock held by another process.
+    """
+
+    def __init__(self, path, commit_every=100, timeout=30.0):
+        self.path = path
+        self.commit_every = commit_every
+        self._uncommitted = 0
+        self._lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS validators '
+            '(url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, content_hash TEXT)'
+        )
+        self.conn.commit()
+
+    def get(self, url):
+        """
+        Returns the validators recorded for `url`.
+
+        Returns:
+            tuple: `(etag, last_modified, content_hash)`, or None if the URL
+            was never stored.
+        """
+
+        with self._lock:
+            return self.conn.execute(
+                'SELECT etag, last_modified, content_hash FROM validators WHERE url = ?', (url,)
+            ).fetchone()
+
+    def put(self, url, etag, last_modified, content_hash):
+        with self._lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO validators (url, etag, last_modified, content_hash) VALUES (?, ?, ?, ?)',
+                (url, etag, last_modified, content_hash),
+            )
+            self._uncommitted += 1
+            if self._uncommitted >= self.commit_every:
+                self.conn.commit()
+                self._uncommitted = 0
+
+    def close(self):
+        with self._lock:
+            self.conn.commit()
+            self.conn.close()
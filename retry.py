@@ -0,0 +1,225 @@
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+from datetime import datetime
+
+from metrics import Metrics
+
+# Kinds of fetch failures, each with its own retry policy
+TIMEOUT = 'timeout'
+NETWORK = 'network'
+DNS = 'dns'
+BROWSER = 'browser'
+THROTTLED = 'throttled'
+
+# Playwright error messages of failures that retrying cannot fix
+_DNS_MARKERS = ('ERR_NAME_NOT_RESOLVED', 'ERR_NAME_RESOLUTION_FAILED')
+_NETWORK_MARKERS = ('net::ERR_', 'NS_ERROR_')
+
+
+def classify_page_error(message):
+    """
+    Returns the failure kind of a Playwright error from its message.
+
+    Unresolvable hosts are `DNS`, other `net::` errors such as resets and
+    refused connections are `NETWORK`, and everything else, typically a
+    crashed page or a closed target, is `BROWSER`.
+    """
+
+    message = message or ''
+    if any(marker in message for marker in _DNS_MARKERS):
+        return DNS
+    if any(marker in message for marker in _NETWORK_MARKERS):
+        return NETWORK
+    return BROWSER
+
+
+def escalated_timeout(timeouts, attempt):
+    """
+    Returns the timeout of the `attempt`-th try, the last one of `timeouts` once they run out.
+    """
+
+    return timeouts[min(attempt, len(timeouts)) - 1]
+
+
+class FetchFailed(Exception):
+    """
+    Raised by a fetch that failed in a way the retry queue knows how to handle.
+
+    Args:
+        url (str): URL that could not be fetched.
+        kind (str): `TIMEOUT`, `NETWORK`, `DNS`, `BROWSER` or `THROTTLED`.
+        message (str): Description of the underlying error.
+    """
+
+    def __init__(self, url, kind, message):
+        super().__init__(f'{kind} error for url {url}: {message}')
+        self.url = url
+        self.kind = kind
+        self.message = message
+
+
+class RetryPolicy:
+    """
+    How often and how soon a failure kind is retried.
+
+    The wait before retry `n` is `base_delay * multiplier ** (n - 1)`, capped
+    at `max_delay`, of which up to a `jitter` share is taken off at random so
+    URLs failing together do not come back together.
+
+    Args:
+        max_attempts (int): Attempts in total, including the first one.
+        base_delay (float): Seconds before the first retry.
+        max_delay (float): Longest wait in seconds.
+        multiplier (float): Growth of the wait per retry.
+        jitter (float): Share of the wait that is randomised, from 0 to 1.
+    """
+
+    __slots__ = ('max_attempts', 'base_delay', 'max_delay', 'multiplier', 'jitter')
+
+    def __init__(self, max_attempts, base_delay, max_delay=300.0, multiplier=2.0, jitter=0.5):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+
+    def delay(self, attempt):
+        """
+        Returns the seconds to wait after the failed `attempt`-th try.
+        """
+
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        return delay * (1 - self.jitter * random.random())
+
+
+DEFAULT_POLICIES = {
+    TIMEOUT: RetryPolicy(3, 10.0, 120.0),
+    NETWORK: RetryPolicy(3, 30.0, 300.0),
+    BROWSER: RetryPolicy(2, 5.0),
+    DNS: RetryPolicy(1, 0.0),
+    # A host answering 429 or 503 asked to be left alone, so it gets the longest waits
+    THROTTLED: RetryPolicy(4, 60.0, 600.0),
+}
+
+
+class RetryEntry:
+    """
+    A failed URL waiting for its next attempt.
+    """
+
+    __slots__ = ('url_id', 'url', 'depth', 'attempt', 'payload')
+
+    def __init__(self, url_id, url, depth, attempt, payload=None):
+        self.url_id = url_id
+        self.url = url
+        self.depth = depth
+        self.attempt = attempt
+        self.payload = payload
+
+
+class DeadLetterLog:
+    """
+    Append-only JSON lines file of the URLs that failed every attempt.
+
+    Each line holds the url_id, URL, depth, number of attempts, failure kind,
+    error message and time, so the URLs can be inspected or queued again by
+    a later run. Safe to share between crawl threads.
+
+    Args:
+        path (str): Path of the file.
+        log (logging.Logger, optional): Logger told about every dead letter.
+    """
+
+    def __init__(self, path, log=None):
+        self.path = path
+        self.logger = log
+        self.count = 0
+        self._lock = threading.Lock()
+        self._file = None
+
+    def add(self, url_id, url, depth, attempts, kind, message):
+        record = {'url_id': url_id, 'url': url, 'depth': depth, 'attempts': attempts, 'kind': kind,
+                  'error': message, 'time': datetime.now().isoformat(timespec='seconds')}
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(json.dumps(record) + '\n')
+            self._file.flush()
+            self.count += 1
+        if self.logger:
+            self.logger.warning(f'Giving up on url {url} after {attempts} attempts ({kind}): {message}')
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class RetryQueue:
+    """
+    Failed URLs of one crawl loop, ordered by the time of their next attempt.
+
+    `schedule` either queues a failed URL after the backoff of its failure
+    kind or, once the policy's attempts are spent or the kind has no policy,
+    writes it to the dead letter log. Not thread-safe; each crawl loop owns
+    its queue.
+
+    Args:
+        dead_letters (DeadLetterLog): Receives the URLs that are given up.
+        policies (dict): `RetryPolicy` by failure kind, `DEFAULT_POLICIES` by default.
+        metrics (Metrics, optional): Receives retry and dead letter counts by kind.
+    """
+
+    def __init__(self, dead_letters, policies=None, metrics=None):
+        self.dead_letters = dead_letters
+        self.policies = DEFAULT_POLICIES if policies is None else policies
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._heap = []
+        self._sequence = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, url_id, url, depth, attempt, kind, message, payload=None):
+        """
+        Queues the next attempt of a URL whose `attempt`-th try failed.
+
+        Returns:
+            bool: True if the URL will be retried, False if it was dead-lettered.
+        """
+
+        policy = self.policies.get(kind)
+        if policy is None or attempt >= policy.max_attempts:
+            self.metrics.inc('dead_letters', kind=kind)
+            self.dead_letters.add(url_id, url, depth, attempt, kind, message)
+            return False
+
+        due = time.monotonic() + policy.delay(attempt)
+        heapq.heappush(self._heap, (due, next(self._sequence), RetryEntry(url_id, url, depth, attempt + 1, payload)))
+        self.metrics.inc('retries', kind=kind)
+        return True
+
+    def pop_due(self):
+        """
+        Removes and returns every entry whose next attempt is due, oldest first.
+        """
+
+        now = time.monotonic()
+        entries = []
+        while self._heap and self._heap[0][0] <= now:
+            entries.append(heapq.heappop(self._heap)[2])
+        return entries
+
+    def next_due(self):
+        """
+        Returns the seconds until the next entry is due, or None if the queue is empty.
+        """
+
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.monotonic())
@@ -0,0 +1,128 @@
+import threading
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+from http_fetcher import DEFAULT_USER_AGENT
+from metrics import Metrics
+
+
+def origin_of(url):
+    parts = urlsplit(url)
+    return f'{parts.scheme}://{parts.netloc}'
+
+
+class _RobotsEntry:
+    """
+    Parsed robots.txt of one origin and the monotonic time it goes stale.
+    """
+
+    __slots__ = ('parser', 'expires', 'lock')
+
+    def __init__(self):
+        self.parser = None
+        self.expires = float('-inf')
+        self.lock = threading.Lock()
+
+
+class RobotsCache:
+    """
+    robots.txt of every origin crawled, fetched once and kept for `ttl` seconds.
+
+    A stale file is fetched again on the next lookup, so a long crawl picks
+    up changed rules and Crawl-delays. Only one thread fetches the file of
+    an origin; others asking at the same time wait for it. A missing file
+    (any other 4xx) allows everything, a 401 or 403 disallows everything,
+    and a file that could not be fetched at all allows everything but is
+    only kept for `error_ttl` seconds. Safe to share between crawl threads.
+
+    Args:
+        log (logging.Logger): Logger used for robots.txt messages.
+        user_agent (str): User agent the rules are looked up for.
+        request_user_agent (str): User agent sent when fetching robots.txt;
+            many sites answer the default `Python-urllib` agent with a 403.
+        ttl (float): Seconds a fetched robots.txt stays fresh.
+        error_ttl (float): Seconds an unreachable robots.txt is treated as empty.
+        timeout (float): Seconds allowed for fetching a robots.txt.
+        metrics (Metrics, optional): Receives the `robots_fetch` stage timing.
+    """
+
+    def __init__(self, log, user_agent='*', ttl=86400.0, error_ttl=300.0, timeout=10, metrics=None,
+                 request_user_agent=DEFAULT_USER_AGENT):
+        self.logger = log
+        self.user_agent = user_agent
+        self.request_user_agent = request_user_agent
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.timeout = timeout
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        """
+        Returns the fresh `RobotFileParser` of the origin of `url`, fetching it if needed.
+        """
+
+        origin = origin_of(url)
+        with self._lock:
+            entry = self._entries.get(origin)
+            if entry is None:
+                entry = self._entries[origin] = _RobotsEntry()
+        if entry.expires > time.monotonic():
+            return entry.parser
+        with entry.lock:
+            # Another thread may have fetched it while this one waited
+            if entry.expires <= time.monotonic():
+                entry.parser, ttl = self._fetch(origin)
+                entry.expires = time.monotonic() + ttl
+            return entry.parser
+
+    def _fetch(self, origin):
+        parser = RobotFileParser(f'{origin}/robots.txt')
+        request = urllib.request.Request(parser.url, headers={'User-Agent': self.request_user_agent})
+        ttl = self.ttl
+        try:
+            with self.metrics.timer('robots_fetch'):
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    lines = response.read().decode('utf-8', errors='replace').splitlines()
+            parser.parse(lines)
+            parser.modified()
+            delay = parser.crawl_delay(self.user_agent)
+            self.logger.info(f'Fetched robots.txt of {origin}' + (f' with a Crawl-delay of {delay}s' if delay else ''))
+        except urllib.error.HTTPError as e:
+            if e.code in (401, 403):
+                parser.disallow_all = True
+            else:
+                parser.allow_all = True
+            self.logger.info(f'robots.txt of {origin} answered {e.code}')
+        except Exception as e:
+            parser.allow_all = True
+            ttl = self.error_ttl
+            self.logger.info(f'Could not fetch robots.txt of {origin}: {e}')
+        # can_fetch answers False until the parser believes it has read the file
+        parser.modified()
+        return parser, ttl
+
+    def crawl_delay(self, url):
+        """
+        Returns the Crawl-delay in seconds of the host of `url`, or 0.
+        """
+
+        return float(self.get(url).crawl_delay(self.user_agent) or 0)
+
+    def allowed(self, url):
+        """
+        Tells whether the rules of the host of `url` allow fetching it.
+        """
+
+        return self.get(url).can_fetch(self.user_agent, url)
+
+    def sitemaps(self, url):
+        """
+        Returns the sitemap URLs listed in the robots.txt of the host of `url`.
+        """
+
+        return list(self.get(url).site_maps() or [])
@@ -0,0 +1,247 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from urllib.parse import urlsplit
+
+from metrics import Metrics
+from robots import RobotsCache
+
+
+class TokenBucket:
+    """
+    Token bucket spacing the requests sent to one host.
+
+    Args:
+        delay (float): Seconds between two requests once the burst is spent.
+            A delay of 0 disables rate limiting.
+        capacity (int): Number of requests that may be sent back to back.
+    """
+
+    def __init__(self, delay, capacity=1):
+        self.delay = delay
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        if self.delay <= 0:
+            self.tokens = self.capacity
+        else:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.delay)
+        self.updated = now
+
+    def ready_at(self, now):
+        """
+        Returns the monotonic time at which the next token is available.
+        """
+
+        self._refill(now)
+        if self.tokens >= 1:
+            return now
+        return now + (1 - self.tokens) * self.delay
+
+    def set_delay(self, delay, now):
+        """
+        Changes the interval; the time passed so far still counts at the old one.
+        """
+
+        self._refill(now)
+        self.delay = delay
+
+    def consume(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _HostQueue:
+    """
+    Pending jobs, rate limit and concurrency of a single host.
+    """
+
+    __slots__ = ('host', 'jobs', 'bucket', 'active', 'max_active', 'last_served')
+
+    def __init__(self, host, delay, max_active):
+        self.host = host
+        self.jobs = deque()
+        self.bucket = TokenBucket(delay)
+        self.active = 0
+        self.max_active = max_active
+        self.last_served = 0.0
+
+
+class HostScheduler:
+    """
+    Politeness scheduler that replaces fixed sleeps with per-host token buckets.
+
+    URLs are submitted together with the callable that fetches them. A fixed
+    set of worker threads always takes the next job from whichever host is
+    eligible first, so a worker never sleeps while another host has work that
+    may be sent. A host is eligible when its token bucket holds a token and
+    fewer than `max_active` of its jobs are running. The bucket interval is
+    the larger of the Config `delay` and the host's robots.txt Crawl-delay.
+
+    With a concurrency controller, `max_active` is only the host's starting
+    limit; the controller's current limit applies, and it may grow up to
+    `ceiling`. Without one, `max_active` and `ceiling` both bound the host.
+    The delay and limits of the latest job submitted for a host apply, so
+    changed Config rows and robots.txt files reach running crawls, whether
+    they raise or lower the values.
+
+    Args:
+        log (logging.Logger): Logger used for scheduler messages.
+        workers (int): Number of worker threads running jobs.
+        respect_robots (bool): Whether robots.txt Crawl-delay is honoured.
+        user_agent (str): User agent looked up in robots.txt.
+        metrics (Metrics, optional): Receives the time every job waited for
+            its host as the `scheduler_wait` stage.
+        controller (ConcurrencyController, optional): Adaptive per-host limits.
+        robots (RobotsCache, optional): Shared robots.txt cache; by default
+            the scheduler keeps its own.
+    """
+
+    def __init__(self, log, workers=8, respect_robots=True, user_agent='*', metrics=None, controller=None, robots=None):
+        self.logger = log
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.controller = controller
+        self.respect_robots = respect_robots
+        self.robots = robots if robots is not None else RobotsCache(log, user_agent, metrics=self.metrics)
+        self._hosts = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._workers = []
+        for worker_id in range(workers):
+            worker = threading.Thread(target=self._worker_loop, name=f'scheduler-{worker_id}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, url, fn, *args, delay=0, max_active=None, ceiling=None):
+        """
+        Queues `fn(*args)` to run once the host of `url` may be fetched again.
+
+        Args:
+            url (str): URL the job fetches; its host selects the bucket.
+            fn (callable): Function performing the fetch.
+            *args: Positional arguments passed to `fn`.
+            delay (float): Minimum seconds between two jobs for this host.
+            max_active (int, optional): Maximum number of jobs running at the
+                same time for this host, only its starting limit with a
+                concurrency controller.
+            ceiling (int, optional): Hard cap on the jobs running at the same
+                time for this host, whatever the controller's limit.
+
+        Returns:
+            concurrent.futures.Future: Future resolved with the return value of `fn`.
+
+        Raises:
+            RuntimeError: If the scheduler has already been closed.
+        """
+
+        host = urlsplit(url).netloc.lower()
+        delay = max(delay or 0, self.crawl_delay(url))
+        future = Future()
+        if self.controller is not None:
+            self.controller.start(host, max_active, ceiling)
+        elif ceiling:
+            max_active = min(max_active, ceiling) if max_active else ceiling
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Scheduler is closed')
+            queue = self._hosts.get(host)
+            if queue is None:
+                queue = self._hosts[host] = _HostQueue(host, delay, max_active)
+            else:
+                queue.bucket.set_delay(delay, time.monotonic())
+                if max_active is not None:
+                    queue.max_active = max_active
+            queue.jobs.append((fn, args, future, time.monotonic()))
+            self._cond.notify()
+        return future
+
+    def crawl_delay(self, url):
+        """
+        Returns the robots.txt Crawl-delay of the host of `url`, or 0.
+
+        robots.txt comes from the robots cache, so it is fetched again once
+        its TTL has passed and a changed Crawl-delay applies to jobs queued
+        from then on. Unreachable or malformed files count as no delay.
+        """
+
+        if not self.respect_robots:
+            return 0
+        return self.robots.crawl_delay(url)
+
+    def pending(self):
+        """
+        Returns the number of queued jobs across all hosts.
+        """
+
+        with self._cond:
+            return sum(len(queue.jobs) for queue in self._hosts.values())
+
+    def close(self):
+        """
+        Cancels queued jobs and stops the worker threads.
+        """
+
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            for queue in self._hosts.values():
+                while queue.jobs:
+                    queue.jobs.popleft()[2].cancel()
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join()
+
+    def _next_job(self):
+        with self._cond:
+            while True:
+                if self._closed:
+                    return None
+
+                now = time.monotonic()
+                best = None
+                best_ready = None
+                for queue in self._hosts.values():
+                    if not queue.jobs:
+                        continue
+                    max_active = self.controller.limit(queue.host) if self.controller is not None else queue.max_active
+                    if max_active is not None and queue.active >= max_active:
+                        continue
+                    ready = queue.bucket.ready_at(now)
+                    if best is None or (ready, queue.last_served) < (best_ready, best.last_served):
+                        best, best_ready = queue, ready
+
+                if best is None:
+                    self._cond.wait()
+                    continue
+                if best_ready > now:
+                    self._cond.wait(timeout=best_ready - now)
+                    continue
+
+                fn, args, future, queued_at = best.jobs.popleft()
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self.metrics.observe('scheduler_wait', now - queued_at)
+                best.bucket.consume(now)
+                best.active += 1
+                best.last_served = now
+                return best, fn, args, future
+
+    def _worker_loop(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            queue, fn, args, future = job
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._cond:
+                    queue.active -= 1
+                    self._cond.notify_all()
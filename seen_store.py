@@ -0,0 +1,178 @@
+import hashlib
+import math
+import os
+import sqlite3
+import struct
+import threading
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+
+    Membership tests never give false negatives; false positives happen at
+    roughly `error_rate` while at most `capacity` items have been added.
+
+    Args:
+        capacity (int): Number of items the filter is sized for.
+        error_rate (float): Target false positive rate at `capacity`.
+    """
+
+    _HEADER = struct.Struct('<QQQ')
+
+    def __init__(self, capacity=1_000_000, error_rate=0.001):
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.count = 0
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def save(self, path):
+        # A per-process temporary file, so processes saving at once never mix their writes
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self._HEADER.pack(self.num_bits, self.num_hashes, self.count))
+            f.write(self.bits)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        bloom = cls.__new__(cls)
+        with open(path, 'rb') as f:
+            bloom.num_bits, bloom.num_hashes, bloom.count = cls._HEADER.unpack(f.read(cls._HEADER.size))
+            bloom.bits = bytearray(f.read())
+        if len(bloom.bits) != (bloom.num_bits + 7) // 8:
+            raise ValueError(f'Corrupt Bloom filter file {path}')
+        return bloom
+
+
+class SeenStore:
+    """
+    Persistent set of URLs combining a Bloom filter with an exact SQLite index.
+
+    Lookups first consult the in-memory Bloom filter, which answers most
+    misses without touching disk; only possible hits are confirmed against
+    the SQLite table. Both are saved next to each other (`path` and
+    `path.bloom`), so the set survives across runs. If the Bloom file is
+    missing, stale or sized for a different capacity, it is rebuilt from the
+    index on open.
+
+    Several processes may share the files. The index uses WAL and a writer
+    waits up to `timeout` seconds for the write lock, which a process holds
+    until its next commit, so shared stores should commit every addition.
+    Each process keeps its own Bloom filter; the one saved last does not
+    count the other processes' URLs and is rebuilt on the next open.
+
+    Args:
+        path (str): Path of the SQLite index file.
+        capacity (int): Number of URLs the Bloom filter is sized for.
+        error_rate (float): Target Bloom filter false positive rate.
+        log (logging.Logger, optional): Logger used for store messages.
+        commit_every (int): Number of additions between two commits.
+        timeout (float): Seconds to wait for a write lock held by another process.
+    """
+
+    def __init__(self, path, capacity=1_000_000, error_rate=0.001, log=None, commit_every=1000, timeout=30.0):
+        self.path = path
+        self.bloom_path = f'{path}.bloom'
+        self.logger = log
+        self.commit_every = commit_every
+        self._uncommitted = 0
+        self._lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS seen (url TEXT PRIMARY KEY)')
+        self.conn.commit()
+        self._size = self.conn.execute('SELECT COUNT(*) FROM seen').fetchone()[0]
+
+        self.bloom = None
+        if os.path.exists(self.bloom_path):
+            try:
+                bloom = BloomFilter.load(self.bloom_path)
+                if bloom.count == self._size and bloom.num_bits == BloomFilter(capacity, error_rate).num_bits:
+                    self.bloom = bloom
+            except (OSError, ValueError, struct.error):
+                pass
+        if self.bloom is None:
+            self.bloom = BloomFilter(capacity, error_rate)
+            for (url,) in self.conn.execute('SELECT url FROM seen'):
+                self.bloom.add(url)
+            if self.logger:
+                self.logger.info(f'Rebuilt Bloom filter from {self._size} urls in {path}')
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, url):
+        with self._lock:
+            if url not in self.bloom:
+                return False
+            return self.conn.execute('SELECT 1 FROM seen WHERE url = ?', (url,)).fetchone() is not None
+
+    def add(self, url):
+        """
+        Adds `url` to the store.
+
+        Returns:
+            bool: True if the URL was not in the store before.
+        """
+
+        with self._lock:
+            cursor = self.conn.execute('INSERT OR IGNORE INTO seen (url) VALUES (?)', (url,))
+            if cursor.rowcount == 0:
+                return False
+            self.bloom.add(url)
+            self._size += 1
+            self._uncommitted += 1
+            if self._uncommitted >= self.commit_every:
+                self.conn.commit()
+                self._uncommitted = 0
+            return True
+
+    def add_many(self, urls):
+        """
+        Adds every URL of `urls` in a single transaction.
+
+        Returns:
+            int: Number of URLs that were new.
+        """
+
+        added = 0
+        with self._lock:
+            for url in urls:
+                cursor = self.conn.execute('INSERT OR IGNORE INTO seen (url) VALUES (?)', (url,))
+                if cursor.rowcount:
+                    self.bloom.add(url)
+                    added += 1
+            self._size += added
+            self.conn.commit()
+            self._uncommitted = 0
+        return added
+
+    def save(self):
+        """
+        Commits pending additions and writes the Bloom filter to disk.
+        """
+
+        with self._lock:
+            self.conn.commit()
+            self._uncommitted = 0
+            self.bloom.save(self.bloom_path)
+
+    def close(self):
+        self.save()
+        self.conn.close()
@@ -0,0 +1,391 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from budget import CrawlBudget, Reservation
+from crawl_state import CrawlState
+
+
+def shard_for(url, num_shards):
+    """
+    Returns the shard owning `url`.
+
+    Every URL of a host lands on the same shard, so politeness, robots.txt
+    and the local seen and validator stores of a host all live in a single
+    worker. The hash is stable across processes and machines, unlike `hash`.
+    """
+
+    host = (urlsplit(url).hostname or '').lower()
+    digest = hashlib.blake2b(host.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') % num_shards
+
+
+class CrawlBackend:
+    """
+    Shared queue, seen set and article counters of a sharded crawl.
+
+    Workers only talk to each other through a backend, so a backend reachable
+    from several machines lets shards run on different nodes. Backends are
+    pickled into the worker processes and must open their connections lazily.
+    Every method must be safe to call from several threads and processes.
+
+    A leased URL belongs to the worker that leased it for as long as that
+    worker keeps sending heartbeats. Once they stop, its leases and the
+    article slots reserved for them are given back, and the URLs of its
+    shard are handed to the workers still alive, so a crashed worker does
+    not keep the crawl from finishing.
+    """
+
+    def reset(self):
+        """
+        Drops every queued URL, seen URL and counter.
+        """
+
+        raise NotImplementedError
+
+    def init_seed(self, url_id, count):
+        """
+        Creates the counter of `url_id` starting at `count`, unless it exists.
+        """
+
+        raise NotImplementedError
+
+    def push(self, shard, url_id, url, depth):
+        raise NotImplementedError
+
+    def pop(self, shard):
+        """
+        Leases the next queued URL of `shard`, or else of a shard whose workers are gone.
+
+        Returns:
+            tuple: `(entry_id, url_id, url, depth)`, or None if there is nothing to lease.
+        """
+
+        raise NotImplementedError
+
+    def heartbeat(self, shard):
+        """
+        Tells the backend that the worker of `shard` using this object is alive.
+        """
+
+        raise NotImplementedError
+
+    def done(self, entry_id):
+        """
+        Marks a leased entry as finished.
+        """
+
+        raise NotImplementedError
+
+    def idle(self):
+        """
+        Tells whether no shard has a queued or leased URL left.
+        """
+
+        raise NotImplementedError
+
+    def mark_seen(self, url_id, urls):
+        """
+        Adds `urls` to the seen set of `url_id`.
+
+        Returns:
+            list: The URLs that had not been seen before, in order.
+        """
+
+        raise NotImplementedError
+
+    def count(self, url_id):
+        raise NotImplementedError
+
+    def reserve(self, url_id, limit, entry_id):
+        """
+        Atomically reserves an article slot of `url_id` for the leased entry
+        `entry_id` if stored and reserved articles are below `limit`.
+
+        Returns:
+            bool: True if the slot was reserved.
+        """
+
+        raise NotImplementedError
+
+    def commit(self, url_id, entry_id):
+        """
+        Turns the slot of `entry_id` taken by `reserve` into a stored article.
+        """
+
+        raise NotImplementedError
+
+    def release(self, url_id, entry_id):
+        """
+        Gives back the slot of `entry_id` taken by `reserve` whose article was not stored.
+        """
+
+        raise NotImplementedError
+
+
+class SQLiteBackend(CrawlBackend):
+    """
+    `CrawlBackend` in a local SQLite file, shared by worker processes of one machine.
+
+    Each thread of each process opens its own connection. Writes run in
+    `BEGIN IMMEDIATE` transactions, so counter reservations and queue leases
+    are atomic across processes, and the file uses WAL so readers do not
+    block the writer.
+
+    Every unpickled copy is a worker of its own, leasing entries under a
+    random owner id. A reserved article slot is a flag on its leased queue
+    entry, so it disappears with the entry or the lease. Owners that sent
+    no heartbeat for `lease_timeout` seconds lose their leases, and the
+    queued entries of a shard without a live owner go to whichever worker
+    asks first. A shard whose worker died before its first heartbeat has no
+    owner at all; it is taken over once `lease_timeout` seconds have passed
+    since the crawl was set up by `reset` or `init_seed`.
+
+    Args:
+        path (str): Path of the SQLite file.
+        timeout (float): Seconds to wait for a lock held by another process.
+        lease_timeout (float): Seconds without a heartbeat after which a worker is considered gone.
+    """
+
+    def __init__(self, path, timeout=30.0, lease_timeout=300.0):
+        self.path = path
+        self.timeout = timeout
+        self.lease_timeout = lease_timeout
+        self.owner = uuid.uuid4().hex
+        self._last_heartbeat = float('-inf')
+        self._local = threading.local()
+
+    def __getstate__(self):
+        return {'path': self.path, 'timeout': self.timeout, 'lease_timeout': self.lease_timeout}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], state['timeout'], state['lease_timeout'])
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS queue (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'shard INTEGER, url_id INTEGER, url TEXT, depth INTEGER, leased INTEGER DEFAULT 0)'
+            )
+            # Lease owners and reservations were added later; upgrade older files in place
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(queue)')}
+            for column, definition in (('owner', 'TEXT'), ('reserved', 'INTEGER DEFAULT 0')):
+                if column not in columns:
+                    conn.execute(f'ALTER TABLE queue ADD COLUMN {column} {definition}')
+            conn.execute('CREATE INDEX IF NOT EXISTS queue_shard ON queue (shard, leased, depth, id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS queue_owner ON queue (owner)')
+            conn.execute('CREATE INDEX IF NOT EXISTS queue_reserved ON queue (url_id, reserved)')
+            conn.execute('CREATE TABLE IF NOT EXISTS seen (url_id INTEGER, url TEXT, PRIMARY KEY (url_id, url))')
+            conn.execute('CREATE TABLE IF NOT EXISTS quota (url_id INTEGER PRIMARY KEY, count INTEGER, reserved INTEGER DEFAULT 0)')
+            conn.execute('CREATE TABLE IF NOT EXISTS workers (owner TEXT PRIMARY KEY, shard INTEGER, heartbeat REAL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL)')
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('started', ?)", (time.time(),))
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, fn):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = fn(conn)
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return result
+
+    def reset(self):
+        def clear(conn):
+            for table in ('queue', 'seen', 'quota', 'workers'):
+                conn.execute(f'DELETE FROM {table}')
+            self._start(conn)
+        self._transaction(clear)
+
+    def init_seed(self, url_id, count):
+        def create(conn):
+            conn.execute('INSERT OR IGNORE INTO quota (url_id, count) VALUES (?, ?)', (url_id, count))
+            self._start(conn)
+        self._transaction(create)
+
+    def _start(self, conn):
+        # Shards without any worker row are only orphaned once their workers had time to start
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('started', ?)", (time.time(),))
+
+    def push(self, shard, url_id, url, depth):
+        self._conn().execute('INSERT INTO queue (shard, url_id, url, depth) VALUES (?, ?, ?, ?)',
+                             (shard, url_id, url, depth))
+
+    def pop(self, shard):
+        def lease(conn):
+            now = time.time()
+            cutoff = now - self.lease_timeout
+            self._beat(conn, shard, now)
+            conn.execute(
+                'UPDATE queue SET leased = 0, owner = NULL, reserved = 0 WHERE leased = 1 AND owner IN '
+                '(SELECT owner FROM workers WHERE heartbeat < ?)', (cutoff,),
+            )
+            row = conn.execute(
+                'SELECT id, url_id, url, depth FROM queue WHERE shard = ? AND leased = 0 ORDER BY depth, id LIMIT 1',
+                (shard,),
+            ).fetchone()
+            if row is None:
+                row = conn.execute(
+                    'SELECT id, url_id, url, depth FROM queue WHERE leased = 0 AND shard NOT IN '
+                    '(SELECT shard FROM workers WHERE heartbeat >= ?) AND '
+                    "(SELECT value FROM meta WHERE key = 'started') < ? ORDER BY depth, id LIMIT 1",
+                    (cutoff, cutoff),
+                ).fetchone()
+            if row is not None:
+                conn.execute('UPDATE queue SET leased = 1, owner = ? WHERE id = ?', (self.owner, row[0]))
+            return row
+        return self._transaction(lease)
+
+    def _beat(self, conn, shard, now):
+        conn.execute('INSERT OR REPLACE INTO workers (owner, shard, heartbeat) VALUES (?, ?, ?)', (self.owner, shard, now))
+        self._last_heartbeat = now
+
+    def heartbeat(self, shard):
+        now = time.time()
+        # A few beats per lease timeout are plenty
+        if now - self._last_heartbeat >= self.lease_timeout / 10:
+            self._beat(self._conn(), shard, now)
+
+    def done(self, entry_id):
+        self._conn().execute('DELETE FROM queue WHERE id = ?', (entry_id,))
+
+    def idle(self):
+        return self._conn().execute('SELECT 1 FROM queue LIMIT 1').fetchone() is None
+
+    def mark_seen(self, url_id, urls):
+        def insert(conn):
+            new_urls = []
+            for url in urls:
+                if conn.execute('INSERT OR IGNORE INTO seen (url_id, url) VALUES (?, ?)', (url_id, url)).rowcount:
+                    new_urls.append(url)
+            return new_urls
+        return self._transaction(insert)
+
+    def count(self, url_id):
+        row = self._conn().execute('SELECT count FROM quota WHERE url_id = ?', (url_id,)).fetchone()
+        return row[0] if row else 0
+
+    def reserve(self, url_id, limit, entry_id):
+        def take(conn):
+            stored = conn.execute('SELECT count FROM quota WHERE url_id = ?', (url_id,)).fetchone()
+            reserved = conn.execute('SELECT COUNT(*) FROM queue WHERE url_id = ? AND reserved = 1', (url_id,)).fetchone()[0]
+            if (stored[0] if stored else 0) + reserved >= limit:
+                return False
+            return conn.execute('UPDATE queue SET reserved = 1 WHERE id = ? AND reserved = 0', (entry_id,)).rowcount == 1
+        return self._transaction(take)
+
+    def commit(self, url_id, entry_id):
+        def store(conn):
+            conn.execute('UPDATE quota SET count = count + 1 WHERE url_id = ?', (url_id,))
+            conn.execute('UPDATE queue SET reserved = 0 WHERE id = ?', (entry_id,))
+        self._transaction(store)
+
+    def release(self, url_id, entry_id):
+        self._conn().execute('UPDATE queue SET reserved = 0 WHERE id = ?', (entry_id,))
+
+
+class LeaseReservation(Reservation):
+    """
+    Article slot reserved in a `CrawlBackend` for one leased queue entry.
+    """
+
+    __slots__ = ('entry_id',)
+
+    def __init__(self, budget, entry_id):
+        super().__init__(budget)
+        self.entry_id = entry_id
+
+    def commit(self):
+        if self.settled:
+            return self.budget.used
+        self.settled = True
+        return self.budget.commit(self.entry_id)
+
+    def release(self):
+        if not self.settled:
+            self.settled = True
+            self.budget.release(self.entry_id)
+
+
+class SharedBudget(CrawlBudget):
+    """
+    `CrawlBudget` whose stored and reserved counts live in a `CrawlBackend`.
+
+    Reservations are taken against the totals of every shard and belong to
+    the leased entry they were taken for; only the futures of this worker
+    are tracked and cancelled on exhaustion.
+
+    Args:
+        backend (CrawlBackend): Backend shared by every shard.
+        url_id (int): Identifier for the URL configuration in the database.
+        limit (int, optional): Maximum number of stored articles across every shard.
+    """
+
+    def __init__(self, backend, url_id, limit=None):
+        self.backend = backend
+        self.url_id = url_id
+        self.limit = limit
+        self._futures = set()
+        self._lock = threading.Lock()
+
+    @property
+    def used(self):
+        return self.backend.count(self.url_id)
+
+    def reserve(self, entry_id):
+        """
+        Takes a slot for the article of the leased entry `entry_id`.
+
+        Returns:
+            LeaseReservation: The reserved slot, or None if every slot is stored or reserved.
+        """
+
+        if not self.backend.reserve(self.url_id, float('inf') if self.limit is None else self.limit, entry_id):
+            return None
+        return LeaseReservation(self, entry_id)
+
+    def commit(self, entry_id):
+        self.backend.commit(self.url_id, entry_id)
+        used = self.used
+        if self.exhausted:
+            self.cancel_pending()
+        return used
+
+    def release(self, entry_id):
+        self.backend.release(self.url_id, entry_id)
+
+
+class SharedCrawlState(CrawlState):
+    """
+    `CrawlState` whose counter and visited set live in a `CrawlBackend`.
+
+    A worker process keeps one per seed, so article slots are reserved and
+    child URLs are filtered against the totals of every shard.
+
+    Args:
+        backend (CrawlBackend): Backend shared by every shard.
+        url_id (int): Identifier for the URL configuration in the database.
+        load_stats (PageLoadStats, optional): Page load figures of the seed in this worker.
+        recrawl_stats (RecrawlStats, optional): Article counts of the seed in this worker.
+        limit (int, optional): Maximum number of articles stored across every shard.
+    """
+
+    def __init__(self, backend, url_id, load_stats=None, recrawl_stats=None, limit=None):
+        self.backend = backend
+        self.url_id = url_id
+        self.budget = SharedBudget(backend, url_id, limit)
+        self.load_stats = load_stats
+        self.recrawl_stats = recrawl_stats
+
+    def filter_unvisited(self, urls):
+        return self.backend.mark_seen(self.url_id, list(urls))
@@ -0,0 +1,357 @@
+import gzip
+import json
+import os
+from datetime import datetime
+
+from metrics import Metrics
+from write_behind import BatchWriter
+
+EXPORT_FORMATS = ('jsonl', 'parquet')
+
+
+def article_record(item, action):
+    """
+    Returns the exported form of an `[url, title, content, timestamp]` article row.
+
+    Args:
+        item (list): Article row as passed to `Database.store_db`.
+        action (str): 'inserted' for a new article, 'updated' for a changed one.
+    """
+
+    return {'url': item[0], 'article_title': item[1], 'article_content': item[2], 'timestamp': item[3],
+            'action': action}
+
+
+class ArticleSink:
+    """
+    Destination of the articles a crawl stores.
+
+    Sinks receive batches of article records from the single writer thread
+    of an `ArticlePipeline`, so they do not need to be thread-safe.
+    """
+
+    def write(self, articles):
+        """
+        Writes a batch of records built by `article_record`.
+        """
+
+        raise NotImplementedError
+
+    def flush(self):
+        """
+        Makes every written record durable or visible downstream.
+        """
+
+    def close(self):
+        self.flush()
+
+
+class DatabaseSink(ArticleSink):
+    """
+    Sends articles to the bloomberg table through `Database.store_db` and `update_db`.
+
+    The database keeps its own batching writer, so this sink only queues
+    rows; closing it flushes them but leaves the connection open.
+
+    Args:
+        db (Database): Connected database with its writer started.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def write(self, articles):
+        for article in articles:
+            row = [article['url'], article['article_title'], article['article_content'], article['timestamp']]
+            if article['action'] == 'updated':
+                self.db.update_db(row)
+            else:
+                self.db.store_db(row)
+
+    def flush(self):
+        self.db.flush()
+
+
+class RotatingFileSink(ArticleSink):
+    """
+    Base of the file sinks, starting a new file every `max_rows` articles.
+
+    A file is written as `<name>.part` and renamed once it is complete, so
+    downstream jobs can pick up every file without the `.part` suffix. File
+    names carry the start time and the process id, so sharded workers can
+    export to the same directory.
+
+    Args:
+        directory (str): Directory receiving the files, created if missing.
+        prefix (str): Start of every file name.
+        max_rows (int): Number of articles per file.
+        log (logging.Logger, optional): Logger told about every finished file.
+    """
+
+    extension = ''
+
+    def __init__(self, directory, prefix='articles', max_rows=100_000, log=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.prefix = prefix
+        self.max_rows = max_rows
+        self.logger = log
+        self.files_written = 0
+        self._path = None
+        self._rows = 0
+        self._sequence = 0
+
+    def write(self, articles):
+        start = 0
+        while start < len(articles):
+            if self._path is None:
+                self._open()
+            chunk = articles[start:start + self.max_rows - self._rows]
+            self._write_rows(chunk)
+            self._rows += len(chunk)
+            start += len(chunk)
+            if self._rows >= self.max_rows:
+                self._rotate()
+
+    def close(self):
+        if self._path is not None:
+            self._rotate()
+
+    def _open(self):
+        self._sequence += 1
+        name = f'{self.prefix}-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}-{self._sequence:05d}{self.extension}'
+        self._path = os.path.join(self.directory, name)
+        self._open_part(f'{self._path}.part')
+
+    def _rotate(self):
+        self._close_part()
+        os.replace(f'{self._path}.part', self._path)
+        self.files_written += 1
+        if self.logger:
+            self.logger.info(f'Exported {self._rows} articles to {self._path}')
+        self._path = None
+        self._rows = 0
+
+    def _open_part(self, path):
+        raise NotImplementedError
+
+    def _write_rows(self, articles):
+        raise NotImplementedError
+
+    def _close_part(self):
+        raise NotImplementedError
+
+
+class JsonlSink(RotatingFileSink):
+    """
+    Writes one JSON object per line, gzip compressed unless `compress` is False.
+
+    A batch is encoded into one string and compressed in a single write.
+
+    Args:
+        directory (str): Directory receiving the files, created if missing.
+        prefix (str): Start of every file name.
+        max_rows (int): Number of articles per file.
+        compress (bool): Whether files are gzip compressed.
+        log (logging.Logger, optional): Logger told about every finished file.
+    """
+
+    def __init__(self, directory, prefix='articles', max_rows=100_000, compress=True, log=None):
+        self.compress = compress
+        self.extension = '.jsonl.gz' if compress else '.jsonl'
+        self._file = None
+        super().__init__(directory, prefix, max_rows, log)
+
+    def _open_part(self, path):
+        if self.compress:
+            self._file = gzip.open(path, 'wt', encoding='utf-8', compresslevel=6)
+        else:
+            self._file = open(path, 'w', encoding='utf-8', buffering=1 << 20)
+
+    def _write_rows(self, articles):
+        self._file.write(''.join(json.dumps(article, ensure_ascii=False) + '\n' for article in articles))
+
+    def _close_part(self):
+        self._file.close()
+        self._file = None
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+
+class ParquetSink(RotatingFileSink):
+    """
+    Writes Parquet files with one row group per `row_group_size` articles.
+
+    Requires pyarrow. Rows are buffered until a row group is full, so a
+    `flush` writes a short row group.
+
+    Args:
+        directory (str): Directory receiving the files, created if missing.
+        prefix (str): Start of every file name.
+        max_rows (int): Number of articles per file.
+        row_group_size (int): Number of articles per row group.
+        compression (str): Parquet compression codec.
+        log (logging.Logger, optional): Logger told about every finished file.
+
+    Raises:
+        ImportError: If pyarrow is not installed.
+    """
+
+    extension = '.parquet'
+
+    def __init__(self, directory, prefix='articles', max_rows=1_000_000, row_group_size=10_000, compression='zstd',
+                 log=None):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError('The parquet export format requires pyarrow') from e
+
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.schema = pyarrow.schema([(name, pyarrow.string()) for name in
+                                      ('url', 'article_title', 'article_content', 'timestamp', 'action')])
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self._writer = None
+        self._buffer = []
+        super().__init__(directory, prefix, max_rows, log)
+
+    def _open_part(self, path):
+        self._writer = self._pq.ParquetWriter(path, self.schema, compression=self.compression)
+
+    def _write_rows(self, articles):
+        self._buffer.extend(articles)
+        if len(self._buffer) >= self.row_group_size:
+            self._write_row_group()
+
+    def _write_row_group(self):
+        if self._buffer:
+            self._writer.write_table(self._pa.Table.from_pylist(self._buffer, schema=self.schema))
+            self._buffer = []
+
+    def _close_part(self):
+        self._write_row_group()
+        self._writer.close()
+        self._writer = None
+
+    def flush(self):
+        if self._writer is not None:
+            self._write_row_group()
+
+
+class ArticlePipeline:
+    """
+    Fans every stored article out to several sinks from a background thread.
+
+    `store` and `update` only put the article on the bounded queue of a
+    `BatchWriter`, whose thread hands it to every sink in batches of
+    `batch_size` articles, or sooner once the oldest article has waited
+    `flush_interval` seconds. A sink that fails is logged and counted
+    without holding back the others. When `max_pending` articles are
+    waiting, `store` blocks until the writer catches up.
+
+    Args:
+        log (logging.Logger): Logger used for pipeline messages.
+        sinks (list): `ArticleSink` objects receiving every article.
+        metrics (Metrics, optional): Receives the `export` stage timing per sink batch and errors.
+        batch_size (int): Maximum number of articles per batch.
+        flush_interval (float): Maximum seconds an article waits before being written.
+        max_pending (int): Maximum number of articles waiting in the queue.
+    """
+
+    def __init__(self, log, sinks, metrics=None, batch_size=500, flush_interval=2.0, max_pending=10000):
+        self.logger = log
+        self.sinks = list(sinks)
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.articles_written = 0
+        self._writer = BatchWriter(log, self._write_batch, 'article-pipeline',
+                                   'Article sinks are behind, waiting for a free slot in the pipeline queue',
+                                   batch_size, flush_interval, max_pending,
+                                   on_flush=lambda: self._each_sink('flush', lambda sink: sink.flush()),
+                                   on_stop=lambda: self._each_sink('close', lambda sink: sink.close()))
+
+    def store(self, item):
+        """
+        Queues a new article row; True means the row was accepted.
+        """
+
+        return self._put(article_record(item, 'inserted'))
+
+    def update(self, item):
+        """
+        Queues a changed article row; True means the row was accepted.
+        """
+
+        return self._put(article_record(item, 'updated'))
+
+    def _put(self, article):
+        self._writer.put(article)
+        return True
+
+    def pending(self):
+        return self._writer.pending() if self._writer is not None else 0
+
+    def flush(self):
+        """
+        Blocks until every queued article has been written and every sink flushed.
+        """
+
+        if self._writer is not None:
+            self._writer.flush()
+
+    def close(self):
+        """
+        Writes the remaining articles, stops the writer thread and closes every sink.
+        """
+
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._writer = None
+        self.logger.info(f'Article pipeline stopped after {self.articles_written} articles')
+
+    def _each_sink(self, action, fn):
+        for sink in self.sinks:
+            try:
+                fn(sink)
+            except Exception as e:
+                self.logger.error(f'{type(sink).__name__} {action} ERROR: {e}')
+                self.metrics.inc('errors', type=type(e).__name__)
+
+    def _write_batch(self, batch):
+        def write(sink):
+            with self.metrics.timer('export'):
+                sink.write(batch)
+        self._each_sink('write', write)
+        self.articles_written += len(batch)
+
+
+def build_sinks(log, db=None, export_dir=None, export_format='jsonl', max_rows=100_000):
+    """
+    Returns the sinks of a crawl: the database if given, and files in `export_dir` if set.
+
+    Args:
+        log (logging.Logger): Logger handed to the file sinks.
+        db (Database, optional): Database receiving the articles.
+        export_dir (str, optional): Directory receiving the exported files.
+        export_format (str): 'jsonl' or 'parquet'.
+        max_rows (int): Number of articles per exported file.
+
+    Raises:
+        ValueError: If `export_format` is unknown.
+    """
+
+    sinks = []
+    if db is not None:
+        sinks.append(DatabaseSink(db))
+    if export_dir:
+        if export_format == 'jsonl':
+            sinks.append(JsonlSink(export_dir, max_rows=max_rows, log=log))
+        elif export_format == 'parquet':
+            sinks.append(ParquetSink(export_dir, max_rows=max_rows, log=log))
+        else:
+            raise ValueError(f'Unknown export format {export_format!r}, expected one of {EXPORT_FORMATS}')
+    return sinks
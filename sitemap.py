@@ -0,0 +1,177 @@
+import gzip
+import io
+import urllib.request
+import xml.etree.ElementTree as ET
+from collections import deque
+from datetime import datetime, timezone
+
+from http_fetcher import DEFAULT_USER_AGENT
+from metrics import Metrics
+from robots import origin_of
+
+_GZIP_MAGIC = b'\x1f\x8b'
+
+
+def parse_w3c_datetime(value):
+    """
+    Returns a `<lastmod>` or `<news:publication_date>` value as an aware datetime.
+
+    Dates without a time are midnight and times without an offset are UTC.
+    Returns None for an empty or malformed value.
+    """
+
+    value = (value or '').strip()
+    if not value:
+        return None
+    if value[-1] in 'zZ':
+        value = value[:-1] + '+00:00'
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def iter_sitemap(stream):
+    """
+    Parses a sitemap, sitemap index or news sitemap incrementally.
+
+    Every `<url>` and `<sitemap>` element is cleared once it has been read,
+    so memory stays flat however many entries the file holds. Only the
+    direct `<loc>` and `<lastmod>` children of an entry count, so the URLs of
+    image or video extensions nested in it are ignored. Elements are
+    matched by local name, which also accepts sitemaps declaring a wrong
+    namespace. A news entry without `<lastmod>` uses the publication date of
+    its `<news:news>` child.
+
+    Args:
+        stream (file): Binary file object of the uncompressed XML.
+
+    Yields:
+        tuple: `(kind, loc, lastmod)`, where kind is 'url' for a page and
+        'sitemap' for a child sitemap of an index, and lastmod is an aware
+        datetime or None.
+
+    Raises:
+        xml.etree.ElementTree.ParseError: If the XML is malformed.
+    """
+
+    root = None
+    for event, element in ET.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = element
+            continue
+        kind = _local_name(element.tag)
+        if kind not in ('url', 'sitemap'):
+            continue
+        loc = lastmod = published = None
+        for child in element:
+            name = _local_name(child.tag)
+            if name == 'loc':
+                loc = (child.text or '').strip()
+            elif name == 'lastmod':
+                lastmod = parse_w3c_datetime(child.text)
+            elif name == 'news':
+                for field in child:
+                    if _local_name(field.tag) == 'publication_date':
+                        published = parse_w3c_datetime(field.text)
+        element.clear()
+        root.clear()
+        if loc:
+            yield kind, loc, lastmod or published
+
+
+class SitemapIngester:
+    """
+    Streams the page URLs of a site's sitemaps with plain HTTP requests.
+
+    Sitemap indexes are followed breadth first, each child sitemap at most
+    once, up to `max_sitemaps` documents. Gzip compressed sitemaps are
+    recognised by their magic bytes. With `since`, pages and child sitemaps
+    whose lastmod is older are skipped, which keeps only the fresh part of
+    an archive sitemap and leaves old monthly sitemaps unfetched; entries
+    without a lastmod are always kept. A sitemap that cannot be fetched or
+    parsed is logged and skipped after the entries already read from it.
+
+    Args:
+        log (logging.Logger): Logger used for sitemap messages.
+        robots (RobotsCache, optional): Finds sitemaps in robots.txt and drops disallowed pages.
+        timeout (float): Seconds allowed for connecting and for every read.
+        user_agent (str): User agent sent with every request.
+        max_sitemaps (int): Most sitemap documents fetched per call of `entries`.
+        metrics (Metrics, optional): Receives sitemap and sitemap URL counts.
+    """
+
+    def __init__(self, log, robots=None, timeout=30, user_agent=DEFAULT_USER_AGENT, max_sitemaps=1000, metrics=None):
+        self.logger = log
+        self.robots = robots
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.max_sitemaps = max_sitemaps
+        self.metrics = metrics if metrics is not None else Metrics()
+
+    def discover(self, url):
+        """
+        Returns the sitemaps of the host of `url`: those listed in its
+        robots.txt, or `/sitemap.xml` if there are none.
+        """
+
+        sitemaps = self.robots.sitemaps(url) if self.robots is not None else []
+        return sitemaps or [f'{origin_of(url)}/sitemap.xml']
+
+    def _open(self, url):
+        request = urllib.request.Request(url, headers={'User-Agent': self.user_agent})
+        response = urllib.request.urlopen(request, timeout=self.timeout)
+        stream = io.BufferedReader(response)
+        if stream.peek(2)[:2] == _GZIP_MAGIC:
+            return gzip.GzipFile(fileobj=stream)
+        return stream
+
+    def entries(self, sitemap_urls, since=None):
+        """
+        Yields the page URLs of the given sitemaps and of the sitemaps they index.
+
+        Args:
+            sitemap_urls (list): URLs of sitemaps or sitemap indexes.
+            since (datetime, optional): Aware datetime; older entries are skipped.
+
+        Yields:
+            tuple: `(url, lastmod)` of every page, lastmod being None if unknown.
+        """
+
+        pending = deque(sitemap_urls)
+        fetched = set()
+        while pending and len(fetched) < self.max_sitemaps:
+            sitemap_url = pending.popleft()
+            if sitemap_url in fetched:
+                continue
+            fetched.add(sitemap_url)
+            pages = stale = disallowed = 0
+            try:
+                with self._open(sitemap_url) as stream:
+                    for kind, loc, lastmod in iter_sitemap(stream):
+                        if since is not None and lastmod is not None and lastmod < since:
+                            stale += 1
+                        elif kind == 'sitemap':
+                            pending.append(loc)
+                        elif self.robots is not None and not self.robots.allowed(loc):
+                            disallowed += 1
+                        else:
+                            pages += 1
+                            yield loc, lastmod
+            except (OSError, ET.ParseError, ValueError) as e:
+                self.logger.warning(f'Could not read sitemap {sitemap_url}: {e}')
+                self.metrics.inc('errors', type=type(e).__name__)
+            self.metrics.inc('sitemaps')
+            self.metrics.inc('sitemap_urls', pages)
+            older = f', {stale} older than {since:%Y-%m-%d %H:%M}' if since is not None else ''
+            self.logger.info(f'Sitemap {sitemap_url}: {pages} urls{older}, {disallowed} disallowed by robots.txt')
+        if pending:
+            self.logger.warning(f'Stopped after {self.max_sitemaps} sitemaps, {len(pending)} left unread')
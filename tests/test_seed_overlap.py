@@ -0,0 +1,79 @@
+import importlib
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# multiple_seedurls needs the crawler's full environment to be imported
+for dependency in ('playwright.sync_api', 'mysql.connector', 'requests', 'lxml'):
+    pytest.importorskip(dependency)
+
+from crawl_config import CrawlConfig
+from scheduler import HostScheduler
+
+SEEDS = 3
+CHILDREN = 2
+VISIT_SECONDS = 0.2
+
+
+class FakeConfigStore:
+    def __init__(self, configs):
+        self.configs = configs
+
+    def get(self, url_id):
+        return self.configs.get(url_id)
+
+
+@pytest.fixture
+def crawler(tmp_path, monkeypatch):
+    # The script opens its log, stores and database connection on import
+    monkeypatch.chdir(tmp_path)
+    crawler = importlib.import_module('multiple_seedurls')
+
+    configs = {
+        url_id: CrawlConfig(url_id, f'http://seed{url_id}.test/', 2, 100, 0, '//a', '//h1', '//p',
+                            re.compile(r'^$'), re.compile(r'.*/story-'), 0, True, 'http')
+        for url_id in range(1, SEEDS + 1)
+    }
+    scheduler = HostScheduler(crawler.logger, workers=4 * SEEDS, respect_robots=False)
+    monkeypatch.setattr(crawler, 'config_store', FakeConfigStore(configs))
+    monkeypatch.setattr(crawler, 'scheduler', scheduler)
+    monkeypatch.setattr(crawler, 'PRINT_PROGRESS', False)
+    yield crawler
+    scheduler.close()
+
+
+def test_discovery_of_several_seeds_overlaps_in_time(crawler, monkeypatch):
+    visits = []
+    lock = threading.Lock()
+
+    def parse_url(url, child_url_xpath, article_title_xpth, article_content_xpth, seed_url_re, child_url_re, state,
+                  reservation, headless, fetch_mode, attempt=1):
+        start = time.monotonic()
+        time.sleep(VISIT_SECONDS)
+        with lock:
+            visits.append((state.url_id, start, time.monotonic()))
+        if '/story-' in url:
+            return []
+        return state.filter_unvisited(f'{url}story-{i}' for i in range(CHILDREN))
+
+    monkeypatch.setattr(crawler, 'parse_url', parse_url)
+
+    with ThreadPoolExecutor(max_workers=SEEDS) as executor:
+        list(executor.map(crawler.main, range(1, SEEDS + 1)))
+
+    spans = {}
+    for url_id, start, end in visits:
+        first, last = spans.get(url_id, (start, end))
+        spans[url_id] = (min(first, start), max(last, end))
+
+    assert len(visits) == SEEDS * (1 + CHILDREN)
+    assert sorted(spans) == list(range(1, SEEDS + 1))
+    # Every seed was still being crawled when the last one started
+    assert max(first for first, _ in spans.values()) < min(last for _, last in spans.values())
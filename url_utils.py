@@ -0,0 +1,66 @@
+from urllib.parse import unquote_plus, urlsplit, urlunsplit
+
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Query parameters that only track where a visitor came from
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'mc_cid', 'mc_eid',
+    'cmpid', 'srnd', 'sref', 'leadsource', '_ga', 'igshid',
+}
+TRACKING_PREFIXES = ('utm_',)
+
+
+def is_tracking_param(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def _query_sort_key(param):
+    name, _, value = param.partition('=')
+    return unquote_plus(name), unquote_plus(value), param
+
+
+def canonicalize_url(url):
+    """
+    Returns the canonical form of `url` used to decide whether it was seen before.
+
+    The scheme and host are lowercased, default ports and fragments are
+    dropped, tracking parameters such as `utm_source` are removed, the
+    remaining query parameters are sorted and an empty path becomes `/`.
+    Query parameters keep their original encoding, and keys without a
+    value keep having none, since the canonical URL is also the one
+    fetched. URLs that are not http(s) are returned unchanged.
+
+    Args:
+        url (str): Absolute URL to canonicalize.
+
+    Returns:
+        str: The canonical URL.
+    """
+
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS:
+        return url
+
+    host = (parts.hostname or '').rstrip('.')
+    # hostname strips the brackets of an IPv6 literal, which the netloc needs back
+    if ':' in host:
+        host = f'[{host}]'
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        netloc = f'{host}:{port}'
+    if parts.username:
+        userinfo = parts.username if parts.password is None else f'{parts.username}:{parts.password}'
+        netloc = f'{userinfo}@{netloc}'
+
+    query = [param for param in parts.query.split('&')
+             if param and not is_tracking_param(unquote_plus(param.partition('=')[0]))]
+    query.sort(key=_query_sort_key)
+
+    return urlunsplit((scheme, netloc, parts.path or '/', '&'.join(query), ''))
@@ -0,0 +1,132 @@
+import queue
+import threading
+import time
+
+# Sentinels put on the queue next to the items
+_FLUSH = object()
+_STOP = object()
+
+STALL_WARNING_INTERVAL = 10
+
+
+class BatchWriter:
+    """
+    Bounded queue drained in batches by a single background thread.
+
+    `put` only queues an item. The thread hands the items to `write` in
+    batches of `batch_size`, or sooner once the oldest item has waited
+    `flush_interval` seconds. When `max_pending` items are waiting, `put`
+    blocks until the thread catches up, so a slow destination slows the
+    crawl down instead of filling memory. `write` handles its own errors;
+    anything it raises is logged and the batch counts as done.
+
+    Args:
+        log (logging.Logger): Logger used for writer messages.
+        write (callable): Called in the writer thread with every batch, a list of items.
+        name (str): Name of the writer thread.
+        stall_warning (str): Logged, at most every `STALL_WARNING_INTERVAL`
+            seconds, while `put` waits for a free slot.
+        batch_size (int): Maximum number of items per batch.
+        flush_interval (float): Maximum seconds an item waits before being written.
+        max_pending (int): Maximum number of items waiting in the queue.
+        on_flush (callable, optional): Called in the writer thread by `flush`
+            once the queued items are written.
+        on_stop (callable, optional): Called in the writer thread by `close`
+            once the last items are written.
+    """
+
+    def __init__(self, log, write, name, stall_warning, batch_size=100, flush_interval=1.0, max_pending=1000,
+                 on_flush=None, on_stop=None):
+        self.logger = log
+        self.write = write
+        self.stall_warning = stall_warning
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.on_stop = on_stop
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._last_stall_warning = float('-inf')
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def put(self, item):
+        """
+        Queues `item`, blocking while `max_pending` items are waiting.
+        """
+
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            now = time.monotonic()
+            if now - self._last_stall_warning >= STALL_WARNING_INTERVAL:
+                self._last_stall_warning = now
+                self.logger.warning(self.stall_warning)
+            self._queue.put(item)
+
+    def pending(self):
+        """
+        Returns the number of items waiting for the writer thread.
+        """
+
+        return self._queue.qsize()
+
+    def flush(self):
+        """
+        Blocks until every queued item has been written.
+        """
+
+        self._queue.put(_FLUSH)
+        self._queue.join()
+
+    def close(self):
+        """
+        Writes the remaining items and stops the writer thread.
+        """
+
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _call(self, fn, *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            self.logger.error(f'{self._thread.name} ERROR: {e}')
+
+    def _write_batch(self, batch):
+        try:
+            self._call(self.write, batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+            batch.clear()
+
+    def _run(self):
+        batch = []
+        deadline = None
+        try:
+            while True:
+                timeout = None if not batch else max(0, deadline - time.monotonic())
+                try:
+                    entry = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    self._write_batch(batch)
+                    continue
+
+                if entry is _FLUSH or entry is _STOP:
+                    if batch:
+                        self._write_batch(batch)
+                    if entry is _FLUSH and self.on_flush is not None:
+                        self._call(self.on_flush)
+                    self._queue.task_done()
+                    if entry is _STOP:
+                        return
+                    continue
+
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(entry)
+                if len(batch) >= self.batch_size:
+                    self._write_batch(batch)
+        finally:
+            if self.on_stop is not None:
+                self._call(self.on_stop)